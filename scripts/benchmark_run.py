@@ -0,0 +1,113 @@
+"""
+End-to-end benchmark of the extraction run (report prepare, run, poll, download and transform) against the local
+stand-in CM360 server from `fake_cm360_server.py`, no Google account is needed.
+
+Reports wall time, peak RSS and download throughput of `Component.run` for N profiles x M rows. The server runs
+in the same process, so the peak RSS includes it.
+
+Usage: python scripts/benchmark_run.py [--profiles 10] [--rows 100000] [--queue-s 2] [--error-rate 0.02] [--async-io]
+"""
+import argparse
+import functools
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'src'))
+
+import component  # noqa: E402
+from fake_cm360_server import FakeCM360Server, FakeServerSettings  # noqa: E402
+from google_cm360 import AsyncGoogleCM360Client, GoogleCM360Client  # noqa: E402
+
+
+def create_data_dir(profile_ids: list, args) -> str:
+    data_dir = tempfile.mkdtemp(prefix='cm360-benchmark-')
+    os.makedirs(os.path.join(data_dir, 'out', 'tables'))
+    os.makedirs(os.path.join(data_dir, 'in'))
+    config = {
+        'parameters': {
+            'profiles': profile_ids,
+            'input_variant': 'report_specification',
+            'report_specification': {'report_type': 'STANDARD', 'dimensions': ['date', 'campaign', 'site'],
+                                     'metrics': ['impressions', 'clicks', 'mediaCost']},
+            'time_range': {'period': 'LAST_7_DAYS'},
+            'destination': {'table_name': 'benchmark', 'incremental_loading': True, 'primary_key': [],
+                            'primary_key_existing': [],
+                            'compress_slices': args.compress,
+                            'output_format': 'parquet' if args.parquet else 'csv'},
+            'performance': {'max_workers': args.workers, 'poll_initial_delay_s': 0.5, 'poll_max_delay_s': 5,
+                            'requests_per_second': 0, 'profile_requests_per_second': 0,
+                            'async_io': args.async_io, 'run_timeout_min': args.run_timeout_min}
+        },
+        'authorization': {'oauth_api': {'credentials': {
+            'appKey': 'benchmark', '#appSecret': 'benchmark',
+            '#data': json.dumps({'access_token': 'benchmark', 'refresh_token': 'benchmark',
+                                 'token_type': 'Bearer', 'scope': 'https://www.googleapis.com/auth/dfareporting'})
+        }}}
+    }
+    with open(os.path.join(data_dir, 'config.json'), 'w') as file:
+        json.dump(config, file)
+    return data_dir
+
+
+def _output_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profiles', type=int, default=10)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--latency-s', type=float, default=0.05)
+    parser.add_argument('--queue-s', type=float, default=2.0)
+    parser.add_argument('--processing-s', type=float, default=1.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--disconnect-rate', type=float, default=0.0)
+    parser.add_argument('--compress', action='store_true')
+    parser.add_argument('--async-io', action='store_true')
+    parser.add_argument('--parquet', action='store_true')
+    parser.add_argument('--run-timeout-min', type=float, default=0)
+    args = parser.parse_args()
+
+    settings = FakeServerSettings(profiles=args.profiles, rows=args.rows, latency_s=args.latency_s,
+                                  queue_s=args.queue_s, processing_s=args.processing_s, error_rate=args.error_rate,
+                                  rate_limit_rate=args.rate_limit_rate, disconnect_rate=args.disconnect_rate)
+    server = FakeCM360Server(settings).start()
+    data_dir = create_data_dir(list(server.state.profiles), args)
+    # environment of a Keboola job, the generated report name is derived from it
+    os.environ.update(KBC_DATADIR=data_dir, KBC_PROJECTID='benchmark', KBC_CONFIGID='benchmark',
+                      KBC_CONFIGROWID='benchmark')
+    # the component talks to the local server instead of Google APIs
+    component.GoogleCM360Client = functools.partial(GoogleCM360Client, root_url=server.root_url,
+                                                    token_uri=server.token_uri)
+    component.AsyncGoogleCM360Client = functools.partial(AsyncGoogleCM360Client, root_url=server.root_url,
+                                                         token_uri=server.token_uri)
+
+    start = time.perf_counter()
+    try:
+        component.Component().run()
+    finally:
+        elapsed = time.perf_counter() - start
+        server.stop()
+
+    downloaded = server.state.bytes_sent
+    output = _output_size(os.path.join(data_dir, 'out'))
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'Profiles: {args.profiles}, rows per report: {args.rows}, queue {args.queue_s} s, '
+          f'error rate {args.error_rate}, rate limit rate {args.rate_limit_rate}, async io {args.async_io}')
+    print(f'Wall time: {elapsed:.2f} s')
+    print(f'Peak RSS: {peak_rss_mb:.1f} MB')
+    print(f'Downloaded: {downloaded / 1024 / 1024:.1f} MB ({downloaded / elapsed / 1024 / 1024:.1f} MB/s), '
+          f'rows: {args.profiles * args.rows / elapsed:.0f} rows/s')
+    print(f'Output: {output / 1024 / 1024:.1f} MB in {data_dir}')
+    print(f'API calls: {server.state.calls}, injected errors: {server.state.errors}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Compares the csv module based report transform with the byte level fast path.
+
+Usage: python scripts/benchmark_transform.py [--rows 1000000] [--quoted-ratio 0.1]
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'src'))
+
+from report_transform import transform_report_stream, transform_report_stream_fast  # noqa: E402
+
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def generate_report(rows: int, quoted_ratio: float, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    lines = ['Campaign Manager 360 Report', 'Report Fields', 'Date,Campaign,Site,Impressions,Clicks,Media Cost']
+    for _ in range(rows):
+        campaign = f'"Campaign, {rng.randint(1, 500)}"' if rng.random() < quoted_ratio else \
+            f'Campaign {rng.randint(1, 500)}'
+        lines.append(f'2024-01-{rng.randint(1, 28):02},{campaign},site-{rng.randint(1, 50)}.com,'
+                     f'{rng.randint(0, 100000)},{rng.randint(0, 1000)},{rng.random() * 100:.2f}')
+    lines.append('Grand Total:,,,1,1,1')
+    return ('\r\n'.join(lines) + '\r\n').encode('utf-8')
+
+
+def _chunks(data: bytes):
+    return (data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE))
+
+
+def _measure(name: str, data: bytes, transform, target):
+    start = time.perf_counter()
+    transform(_chunks(data), target, '1234567', 'Benchmark profile')
+    elapsed = time.perf_counter() - start
+    print(f'{name:>10}: {elapsed:7.3f} s  {len(data) / elapsed / 1024 / 1024:8.1f} MB/s')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--quoted-ratio', type=float, default=0.1)
+    args = parser.parse_args()
+
+    data = generate_report(args.rows, args.quoted_ratio)
+    print(f'Report: {args.rows} rows, {len(data) / 1024 / 1024:.1f} MB, quoted ratio {args.quoted_ratio}')
+    csv_time = _measure('csv', data, transform_report_stream, io.StringIO())
+    fast_time = _measure('fast', data, transform_report_stream_fast, io.BytesIO())
+    print(f'Speedup: {csv_time / fast_time:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,428 @@
+"""
+Local stand-in of the CM360 (dfareporting v4) API for benchmarks and end-to-end tests without a Google account.
+
+Covers the discovery document, user profiles, reports CRUD and run, report files (status, listing and media download
+with Range requests), batch requests, the metadata list endpoints and OAuth token refresh. Latency, report sizes,
+queue times, error rates and media downloads dropped mid-body are configurable.
+
+Usage: python scripts/fake_cm360_server.py [--port 8080] [--rows 100000] [--queue-s 5] [--error-rate 0.05]
+                                           [--disconnect-rate 0.1]
+"""
+import argparse
+import email.parser
+import email.policy
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'src'))
+
+from date_ranges import resolve_date_range  # noqa: E402
+from google_cm360.discovery_cache import load_discovery_document  # noqa: E402
+
+SERVICE_PATH = '/dfareporting/v4/'
+MEDIA_BLOCK_ROWS = 10000
+MEDIA_WRITE_SIZE = 64 * 1024
+
+
+@dataclass
+class FakeServerSettings:
+    profiles: int = 3
+    # data rows of each report file
+    rows: int = 10000
+    # delay of each API call in seconds
+    latency_s: float = 0.0
+    # seconds a report file stays QUEUED and then PROCESSING
+    queue_s: float = 2.0
+    processing_s: float = 1.0
+    # share of API calls failing with HTTP 503 and HTTP 429
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    # share of media downloads whose connection is closed at a random point of the body
+    disconnect_rate: float = 0.0
+    # if set, every media download sends at most this many bytes of the body and closes the connection
+    disconnect_after_bytes: int = 0
+    # items of each metadata endpoint and profile, returned in pages
+    metadata_items: int = 250
+    page_size: int = 100
+    seed: int = 0
+
+
+class FakeCM360State:
+    """In-memory profiles, reports and report files shared by all request handlers."""
+
+    def __init__(self, settings: FakeServerSettings):
+        self.settings = settings
+        self.profiles = {str(1000 + i): f'Profile {i}' for i in range(settings.profiles)}
+        self.reports = {}
+        self.files = {}
+        self.calls = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._rng = random.Random(settings.seed)
+
+    def next_id(self) -> str:
+        with self.lock:
+            return str(next(self._ids))
+
+    def injected_error(self) -> Optional[HTTPStatus]:
+        with self.lock:
+            self.calls += 1
+            draw = self._rng.random()
+            if draw < self.settings.error_rate:
+                error = HTTPStatus.SERVICE_UNAVAILABLE
+            elif draw < self.settings.error_rate + self.settings.rate_limit_rate:
+                error = HTTPStatus.TOO_MANY_REQUESTS
+            else:
+                return None
+            self.errors += 1
+            return error
+
+    def disconnect_at(self, body_size: int) -> Optional[int]:
+        """Returns the number of body bytes sent before the connection is closed, None to send the whole body."""
+        settings = self.settings
+        if settings.disconnect_after_bytes and body_size > settings.disconnect_after_bytes:
+            return settings.disconnect_after_bytes
+        with self.lock:
+            if body_size > 1 and self._rng.random() < settings.disconnect_rate:
+                self.errors += 1
+                return self._rng.randrange(1, body_size)
+        return None
+
+    def file_status(self, report_file: dict) -> str:
+        elapsed = time.time() - report_file['created']
+        if elapsed < self.settings.queue_s:
+            return 'QUEUED'
+        if elapsed < self.settings.queue_s + self.settings.processing_s:
+            return 'PROCESSING'
+        return 'REPORT_AVAILABLE'
+
+
+def _error(status: HTTPStatus, reason: str = None) -> Tuple[int, dict]:
+    reason = reason or ('rateLimitExceeded' if status == HTTPStatus.TOO_MANY_REQUESTS else 'backendError')
+    return status, {'error': {'code': int(status), 'message': status.phrase,
+                              'errors': [{'reason': reason, 'message': status.phrase}]}}
+
+
+def _criteria(report: dict) -> dict:
+    return next((value for key, value in report.items() if key.endswith('riteria') and isinstance(value, dict)), {})
+
+
+class FakeCM360Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state: FakeCM360State = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def do_PUT(self):
+        self._handle()
+
+    def do_PATCH(self):
+        self._handle()
+
+    def do_DELETE(self):
+        self._handle()
+
+    def _handle(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        url = urlparse(self.path)
+        if url.path == '/batch':
+            self._send_batch(body)
+            return
+        if url.path == '/token':
+            # OAuth token refresh
+            self._send_json(HTTPStatus.OK, {'access_token': 'fake-token', 'expires_in': 3600, 'token_type': 'Bearer'})
+            return
+        if url.path == '/$discovery/rest':
+            self._send_json(HTTPStatus.OK, self._discovery_document())
+            return
+        if url.path.startswith(SERVICE_PATH) and parse_qs(url.query).get('alt') == ['media']:
+            self._send_media(url.path[len(SERVICE_PATH):])
+            return
+        status, response = self._call(self.command, url, body)
+        self._send_json(status, response)
+
+    def _call(self, method: str, url, body: bytes) -> Tuple[int, Optional[dict]]:
+        time.sleep(self.state.settings.latency_s)
+        error = self.state.injected_error()
+        if error:
+            return _error(error)
+        if not url.path.startswith(SERVICE_PATH):
+            return _error(HTTPStatus.NOT_FOUND, 'notFound')
+        return self._route(method, url.path[len(SERVICE_PATH):], parse_qs(url.query),
+                           json.loads(body) if body else None)
+
+    def _route(self, method: str, path: str, query: dict, body: Optional[dict]) -> Tuple[int, Optional[dict]]:
+        state = self.state
+        parts = path.strip('/').split('/')
+        if parts == ['userprofiles']:
+            return HTTPStatus.OK, {'kind': 'dfareporting#userProfileList',
+                                   'items': [{'profileId': profile_id, 'userName': name, 'accountId': '1'}
+                                             for profile_id, name in state.profiles.items()]}
+        if parts[0] == 'reports' and len(parts) == 4:
+            # files.get
+            return self._get_file(parts[1], parts[3])
+        if parts[0] != 'userprofiles' or len(parts) < 3 or parts[1] not in state.profiles:
+            return _error(HTTPStatus.NOT_FOUND, 'notFound')
+
+        profile_id = parts[1]
+        if parts[2] == 'reports':
+            return self._route_reports(method, profile_id, parts[3:], query, body)
+        if method == 'GET' and len(parts) == 3:
+            return self._list_metadata(profile_id, parts[2], query)
+        return _error(HTTPStatus.NOT_FOUND, 'notFound')
+
+    def _route_reports(self, method: str, profile_id: str, parts: list, query: dict,
+                       body: Optional[dict]) -> Tuple[int, Optional[dict]]:
+        state = self.state
+        if not parts:
+            if method == 'POST':
+                return HTTPStatus.OK, self._save_report(profile_id, state.next_id(), body)
+            reports = [report for report in state.reports.values() if report['ownerProfileId'] == profile_id]
+            return HTTPStatus.OK, self._report_list_page(reports, query)
+
+        report = state.reports.get(parts[0])
+        if report is None or report['ownerProfileId'] != profile_id:
+            return _error(HTTPStatus.NOT_FOUND, 'notFound')
+        if len(parts) == 1:
+            if method == 'GET':
+                return HTTPStatus.OK, report
+            if method == 'PUT':
+                return HTTPStatus.OK, self._save_report(profile_id, report['id'], body)
+            if method == 'PATCH':
+                return HTTPStatus.OK, self._save_report(profile_id, report['id'], dict(report, **body))
+            if method == 'DELETE':
+                state.reports.pop(report['id'], None)
+                return HTTPStatus.NO_CONTENT, None
+        if parts[1:] == ['run'] and method == 'POST':
+            return HTTPStatus.OK, self._run_report(report)
+        if parts[1:] == ['files'] and method == 'GET':
+            files = sorted((self._file_resource(report_file) for report_file in state.files.values()
+                            if report_file['reportId'] == report['id']),
+                           key=lambda report_file: int(report_file['lastModifiedTime']), reverse=True)
+            return HTTPStatus.OK, {'kind': 'dfareporting#fileList',
+                                   'items': files[:int(query.get('maxResults', ['10'])[0])]}
+        if len(parts) == 3 and parts[1] == 'files':
+            return self._get_file(report['id'], parts[2])
+        return _error(HTTPStatus.NOT_FOUND, 'notFound')
+
+    @staticmethod
+    def _report_list_page(reports: list, query: dict) -> dict:
+        start = int(query.get('pageToken', ['0'])[0])
+        end = start + int(query.get('maxResults', ['10'])[0])
+        response = {'kind': 'dfareporting#reportList', 'items': reports[start:end]}
+        if end < len(reports):
+            response['nextPageToken'] = str(end)
+        # partial response, only the nextPageToken,items(field,...) form is supported
+        match = re.fullmatch(r'nextPageToken,items\((.+)\)', query.get('fields', [''])[0])
+        if match:
+            fields = match.group(1).split(',')
+            response = dict(items=[{field: report[field] for field in fields if field in report}
+                                   for report in response['items']],
+                            **({'nextPageToken': response['nextPageToken']} if 'nextPageToken' in response else {}))
+        return response
+
+    def _save_report(self, profile_id: str, report_id: str, body: dict) -> dict:
+        report = dict(body, id=report_id, ownerProfileId=profile_id, accountId='1', kind='dfareporting#report',
+                      etag=f'"{self.state.next_id()}"', lastModifiedTime=str(int(time.time() * 1000)))
+        self.state.reports[report_id] = report
+        return report
+
+    def _run_report(self, report: dict) -> dict:
+        date_range = _criteria(report).get('dateRange') or {}
+        resolved = resolve_date_range(date_range, date.today()) or (date.today(), date.today())
+        report_file = {'id': self.state.next_id(), 'reportId': report['id'], 'created': time.time(),
+                       'dateRange': {'startDate': resolved[0].isoformat(), 'endDate': resolved[1].isoformat()},
+                       'dimensions': len(_criteria(report).get('dimensions', [])),
+                       'columns': [dimension['name'] for dimension in _criteria(report).get('dimensions', [])]
+                       + list(_criteria(report).get('metricNames', []))}
+        self.state.files[report_file['id']] = report_file
+        return self._file_resource(report_file)
+
+    def _file_resource(self, report_file: dict) -> dict:
+        status = self.state.file_status(report_file)
+        return {'kind': 'dfareporting#file', 'id': report_file['id'], 'reportId': report_file['reportId'],
+                'status': status, 'format': 'CSV', 'fileName': f'report_{report_file["id"]}',
+                'dateRange': dict(report_file['dateRange'], kind='dfareporting#dateRange'),
+                'lastModifiedTime': str(int(report_file['created'] * 1000)), 'etag': f'"{status}"'}
+
+    def _get_file(self, report_id: str, file_id: str) -> Tuple[int, Optional[dict]]:
+        report_file = self.state.files.get(file_id)
+        if report_file is None or report_file['reportId'] != report_id:
+            return _error(HTTPStatus.NOT_FOUND, 'notFound')
+        return HTTPStatus.OK, self._file_resource(report_file)
+
+    def _list_metadata(self, profile_id: str, endpoint: str, query: dict) -> Tuple[int, dict]:
+        start = int(query.get('pageToken', ['0'])[0])
+        end = min(start + self.state.settings.page_size, self.state.settings.metadata_items)
+        response = {endpoint: [{'id': str(item_id), 'name': f'{endpoint} {item_id}', 'accountId': '1',
+                                'profileId': profile_id} for item_id in range(start, end)]}
+        if end < self.state.settings.metadata_items:
+            response['nextPageToken'] = str(end)
+        return HTTPStatus.OK, response
+
+    def _discovery_document(self) -> dict:
+        root_url = f'http://{self.headers["Host"]}/'
+        return dict(load_discovery_document(), rootUrl=root_url, baseUrl=root_url + SERVICE_PATH.lstrip('/'))
+
+    def _send_json(self, status: int, response: Optional[dict]):
+        content = json.dumps(response).encode() if response is not None else b''
+        self.send_response(status)
+        if status == HTTPStatus.TOO_MANY_REQUESTS:
+            self.send_header('Retry-After', '1')
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _send_media(self, path: str):
+        match = re.fullmatch(r'reports/(\d+)/files/(\d+)', path)
+        report_file = self.state.files.get(match.group(2)) if match else None
+        if report_file is None or self.state.file_status(report_file) != 'REPORT_AVAILABLE':
+            self._send_json(*_error(HTTPStatus.NOT_FOUND, 'notFound'))
+            return
+
+        content = b''.join(self._report_content(report_file))
+        start = 0
+        range_match = re.fullmatch(r'bytes=(\d+)-', self.headers.get('Range') or '')
+        if range_match:
+            start = int(range_match.group(1))
+            if start >= len(content):
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header('Content-Range', f'bytes */{len(content)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(HTTPStatus.PARTIAL_CONTENT)
+            self.send_header('Content-Range', f'bytes {start}-{len(content) - 1}/{len(content)}')
+        else:
+            self.send_response(HTTPStatus.OK)
+        body = memoryview(content)[start:]
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        disconnect_at = self.state.disconnect_at(len(body))
+        if disconnect_at is not None:
+            # the announced Content-Length is not reached, the client has to resume with a Range request
+            body = body[:disconnect_at]
+            self.close_connection = True
+        for block_start in range(0, len(body), MEDIA_WRITE_SIZE):
+            block = body[block_start:block_start + MEDIA_WRITE_SIZE]
+            self.wfile.write(block)
+            with self.state.lock:
+                self.state.bytes_sent += len(block)
+
+    def _report_content(self, report_file: dict):
+        columns = report_file['columns'] or ['date', 'impressions']
+        dimensions = report_file.get('dimensions') or 1
+        rng = random.Random(int(report_file['id']))
+        yield ('Fake CM360 report\r\n\r\nReport Fields\r\n' + ','.join(columns) + '\r\n').encode()
+        rows = self.state.settings.rows
+        for block_start in range(0, rows, MEDIA_BLOCK_ROWS):
+            lines = []
+            for row in range(block_start, min(rows, block_start + MEDIA_BLOCK_ROWS)):
+                # dimensions are quoted text, impressions and clicks are counts, other metrics are decimal (e.g. a cost)
+                values = [f'"Value, {rng.randint(1, 500)}"' if index < dimensions
+                          else str(rng.randint(0, 100000)) if columns[index].lower().endswith(('impressions', 'clicks'))
+                          else f'{rng.uniform(0, 1000):.2f}'
+                          for index in range(1, len(columns))]
+                lines.append(','.join([f'2024-01-{row % 28 + 1:02}'] + values))
+            yield ('\r\n'.join(lines) + '\r\n').encode()
+        yield ('Grand Total:' + ',' * (len(columns) - 1) + '\r\n').encode()
+
+    def _send_batch(self, body: bytes):
+        message = email.parser.BytesParser(policy=email.policy.compat32).parsebytes(
+            f'Content-Type: {self.headers["Content-Type"]}\r\n\r\n'.encode() + body)
+        boundary = f'batch_{self.state.next_id()}'
+        parts = []
+        for part in message.get_payload():
+            request_line, _, rest = part.get_payload().partition('\n')
+            method, uri, _ = request_line.strip().split(' ')
+            part_body = rest.replace('\r\n', '\n').partition('\n\n')[2].strip()
+            status, response = self._call(method, urlparse(uri), part_body.encode())
+            content = json.dumps(response) if response is not None else ''
+            parts.append(f'--{boundary}\r\nContent-Type: application/http\r\n'
+                         f'Content-ID: <response-{part["Content-ID"][1:-1]}>\r\n\r\n'
+                         f'HTTP/1.1 {int(status)} {HTTPStatus(status).phrase}\r\n'
+                         f'Content-Type: application/json; charset=UTF-8\r\n\r\n{content}\r\n')
+        content = (''.join(parts) + f'--{boundary}--\r\n').encode()
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', f'multipart/mixed; boundary={boundary}')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class FakeCM360Server(ThreadingHTTPServer):
+    """Threaded fake CM360 server, `start` serves requests in a background thread."""
+    daemon_threads = True
+
+    def __init__(self, settings: FakeServerSettings = None, port: int = 0):
+        self.state = FakeCM360State(settings or FakeServerSettings())
+        handler = type('Handler', (FakeCM360Handler,), {'state': self.state})
+        super().__init__(('127.0.0.1', port), handler)
+
+    @property
+    def root_url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}/'
+
+    @property
+    def token_uri(self) -> str:
+        return self.root_url + 'token'
+
+    def start(self) -> 'FakeCM360Server':
+        threading.Thread(target=self.serve_forever, name='fake-cm360', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--profiles', type=int, default=3)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--latency-s', type=float, default=0.0)
+    parser.add_argument('--queue-s', type=float, default=2.0)
+    parser.add_argument('--processing-s', type=float, default=1.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--disconnect-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    settings = FakeServerSettings(profiles=args.profiles, rows=args.rows, latency_s=args.latency_s,
+                                  queue_s=args.queue_s, processing_s=args.processing_s, error_rate=args.error_rate,
+                                  rate_limit_rate=args.rate_limit_rate, disconnect_rate=args.disconnect_rate)
+    server = FakeCM360Server(settings, port=args.port)
+    print(f'Fake CM360 API listening on {server.root_url} (profiles {", ".join(server.state.profiles)})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
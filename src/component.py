@@ -2,13 +2,22 @@
 Template Component main class.
 
 """
-import csv
 # from typing import List, Tuple
+import asyncio
+import copy
+import functools
 import json
 import logging
+import math
 import os
+import threading
 import time
-from typing import Dict, List
+from collections import Counter
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from contextlib import closing
+from datetime import date, timedelta
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 import dateparser
 import requests
@@ -16,31 +25,63 @@ from google.auth.exceptions import RefreshError
 from keboola.component.base import ComponentBase, sync_action
 from keboola.component.exceptions import UserException
 from keboola.component.sync_actions import SelectElement
-from keboola.csvwriter import ElasticDictWriter
 
-from configuration import Configuration, InputVariant
+from configuration import Configuration, InputVariant, OutputFormat, Performance
 from configuration import FILE_JSON_LABELS
-from google_cm360 import GoogleCM360Client
+from date_ranges import custom_date_range, resolve_date_range, split_date_range
+from google_cm360 import AsyncGoogleCM360Client, GoogleCM360Client
 from google_cm360.report_specification import \
     CsvReportSpecification, MAP_REPORT_TYPE_2_COMPATIBLE_SECTION, MAP_REPORT_TYPE_2_CRITERIA
-
-
-def _load_attribute_labels_from_json(report_type, attribute):
-    all_labels = None
+from metadata_export import MetadataExporter
+from metadata_writer import MetadataTableWriter, endpoint_schema
+from parquet_writer import ParquetSliceWriter
+from profile_history import ProfileHistory
+from report_polling import ReportPollScheduler
+from report_transform import transform_report_rows, transform_report_stream_fast
+from run_deadline import RunDeadline
+from run_metrics import METRICS_FILE_NAME, RunMetrics
+from slice_writer import open_slice
+
+
+@functools.lru_cache(maxsize=None)
+def _load_labels_index() -> Dict[tuple, dict]:
+    """Loads the labels file once per process into an index keyed by (report_type, attribute)."""
     try:
         path = os.path.join(os.path.dirname(__file__), FILE_JSON_LABELS)
         with open(path, mode='r') as file:
             all_labels = json.load(fp=file)
-        return all_labels.get(report_type).get(attribute)
+        return {(report_type, attribute): labels
+                for report_type, attributes in all_labels.items()
+                for attribute, labels in attributes.items()}
     except Exception:
         return {}
 
 
+def _load_attribute_labels_from_json(report_type, attribute):
+    return _load_labels_index().get((report_type, attribute), {})
+
+
 def _translate_dimensions(report_type: str, dims: list):
     labels = _load_attribute_labels_from_json(report_type=report_type, attribute="dimensions")
     return [labels.get(dim_id) if dim_id in labels else dim_id for dim_id in dims]
 
 
+def _iter_async_chunks(chunks: AsyncIterator[bytes], loop: asyncio.AbstractEventLoop) -> Iterator[bytes]:
+    """Iterates chunks of an async iterator running in the event loop from a worker thread."""
+    try:
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(chunks.__anext__(), loop).result()
+            except StopAsyncIteration:
+                return
+    finally:
+        asyncio.run_coroutine_threadsafe(chunks.aclose(), loop).result()
+
+
+class DownloadAborted(Exception):
+    """Raised in downloads interrupted because the run is being aborted."""
+
+
 class Component(ComponentBase):
     """
         Extends base class for general Python components. Initializes the CommonInterface
@@ -56,11 +97,24 @@ class Component(ComponentBase):
         super().__init__()
         self.cfg: Configuration = None
         self.google_client: GoogleCM360Client
+        self.async_google_client: AsyncGoogleCM360Client = None
 
         self.existing_reports_cache: dict = {}
+        self.report_fingerprints: dict = {}
+        self.watermarks: dict = {}
+        self.pending_watermarks: dict = {}
+        self.pending_deletions: list = []
+        self._cleanup: Future = None
         self.common_report_type: str = None
         self.common_dimensions: list = None
         self.common_metrics: list = None
+        self._header_lock = threading.Lock()
+        self._first_header: list = None
+        self._abort = threading.Event()
+        self.metrics = RunMetrics()
+        self.deadline = RunDeadline(0)
+        self._deadline_exceeded = False
+        self.history = ProfileHistory()
 
     def run(self):
         """Main extractor method - it reads current configuration, run report(s)
@@ -75,11 +129,16 @@ class Component(ComponentBase):
         """
 
         self.init_configuration()
+        self.deadline = RunDeadline(self.cfg.performance.run_timeout_min * 60)
 
         prev_state = self.get_state_file()
         self.existing_reports_cache = prev_state.get('reports')
         if not self.existing_reports_cache:
             self.existing_reports_cache = {}
+        self.report_fingerprints = prev_state.get('report_fingerprints') or {}
+        self.watermarks = prev_state.get('watermarks') or {}
+        self.pending_deletions = prev_state.get('pending_deletions') or []
+        self.history = ProfileHistory(prev_state.get('profile_history'))
 
         """
             Prepare a list reports
@@ -90,7 +149,8 @@ class Component(ComponentBase):
                     If a report was found apply a patch if necessary (date changed...)
                     If no report was found create a new one based on report definition
         """
-        self._init_google_client()
+        with self.metrics.phase('client_init'):
+            self._init_google_client()
 
         if self.cfg.input_variant == InputVariant.METADATA:
             metadata = self.cfg.metadata
@@ -99,66 +159,95 @@ class Component(ComponentBase):
             if not profile_ids:
                 profile_ids = list(self.google_client.list_profiles().keys())
 
-            for endpoint in metadata:
-                writer = None
-
-                for profile in profile_ids:
-
-                    logging.info(f'Listing metadata for {endpoint} in profile {profile}')
-
-                    result = self.google_client.list_metadata(profile_id=profile, endpoint_name=endpoint)
+            table_defs = {}
 
-                    if first := next(result, None):
+            def _create_writer(endpoint: str) -> MetadataTableWriter:
+                table_defs[endpoint] = self.create_out_table_definition(name=f'metadata_{endpoint}.csv',
+                                                                        primary_key=["profile_id", "id"])
+                schema = endpoint_schema(self.google_client.discovery_document, endpoint)
+                if not schema:
+                    logging.info(f'No schema of {endpoint} in the discovery document, using fields of the first item')
+                return MetadataTableWriter(table_defs[endpoint].full_path, schema=schema)
 
-                        if not writer:
-                            table_def = self.create_out_table_definition(name=f'metadata_{endpoint}.csv',
-                                                                         primary_key=["profile_id", "id"])
-                            writer = ElasticDictWriter(table_def.full_path, fieldnames=["profile_id", "id"])
-                            writer.writeheader()
-
-                        first['profile_id'] = profile
-                        writer.writerow(first)
-
-                        for item in result:
-                            item['profile_id'] = profile
-                            writer.writerow(item)
-
-                if writer:
-                    writer.close()
-                    self.write_manifest(table_def)
+            exporter = MetadataExporter(self.google_client, max_workers=self.cfg.performance.max_workers)
+            with self.metrics.phase('metadata_export'):
+                rows = exporter.export(metadata, profile_ids, writer_factory=_create_writer)
+            for endpoint, table_def in table_defs.items():
+                logging.info(f'Exported {rows[endpoint]} rows of {endpoint}')
+                self.write_manifest(table_def)
 
         if self.cfg.input_variant != InputVariant.METADATA:
-            if self.cfg.input_variant != InputVariant.REPORT_IDS:
-                reports_2_run = self._process_generated_reports()
+            with self.metrics.phase('prepare'):
+                if self.cfg.input_variant != InputVariant.REPORT_IDS:
+                    reports_2_run = self._process_generated_reports()
+                else:
+                    reports_2_run = self._process_existing_reports()
+            # the reports expected to take longest are started first
+            reports_2_run = self.history.longest_first(reports_2_run)
+
+            if self.cfg.performance.async_io:
+                with self.metrics.phase('run_wait_download'):
+                    report_files = self._run_wait_download_async(reports_2_run)
             else:
-                reports_2_run = self._process_existing_reports()
-
-            # Run all reports
-            report_files = []
-            for item in reports_2_run:
-                profile_id = item['profile_id']
-                report_id = item['report_id']
-                report_file = self.google_client.run_report(profile_id=profile_id, report_id=report_id)
-                logging.info(f'Report {report_id} started')
-                report_files.append(dict(profile_id=profile_id, report_id=report_id, file_id=report_file['id']))
-
-            self._assign_profile_names(report_files)
-            time.sleep(5)
-
-            wait_files = report_files.copy()
-            while wait_files:
-                logging.info(f'Waiting for {len(wait_files)} running report(s)')
-                wait_files = self._wait_process_report_files(wait_files)
-                if wait_files:
-                    time.sleep(20)
-
-            self.write_state_file(state_dict=dict(reports=self.existing_reports_cache))
-
-            header = self._process_report_files(report_files)
-            final_header = self.common_dimensions.copy()
-            final_header.insert(0, header[1])
-            final_header.insert(0, header[0])
-            self._write_common_manifest(dimensions=final_header, metrics=self.common_metrics)
+                # Run all reports
+                with self.metrics.phase('run'):
+                    report_files = self._run_reports(reports_2_run)
+
+                self._assign_profile_names(report_files)
+
+                with self.metrics.phase('wait_download'):
+                    self._wait_download_report_files(report_files)
+            if not self._deadline_exceeded and all(rf.get('header') for rf in report_files):
+                # otherwise the run fails, its output is not loaded, the next run must fetch the same dates again
+                self._advance_watermarks(report_files)
+            self._update_profile_history(report_files)
+            self._finish_stale_reports_cleanup()
+            self._prune_profile_state({item['profile_id'] for item in reports_2_run})
+
+            self.write_state_file(state_dict=dict(reports=self.existing_reports_cache,
+                                                  report_fingerprints=self.report_fingerprints,
+                                                  watermarks=self.watermarks,
+                                                  pending_deletions=self.pending_deletions,
+                                                  profile_history=self.history.to_dict()))
+            if self._deadline_exceeded:
+                self._finish_run_metrics()
+                raise UserException(self._deadline_summary(reports_2_run, report_files))
+
+            with self.metrics.phase('manifest'):
+                header = self._process_report_files(report_files)
+                final_header = self.common_dimensions.copy()
+                final_header.insert(0, header[1])
+                final_header.insert(0, header[0])
+                if self._parquet_output:
+                    self._write_parquet_manifests(report_files)
+                else:
+                    self._write_common_manifest(dimensions=final_header, metrics=self.common_metrics)
+
+        self._finish_run_metrics()
+
+    def _finish_run_metrics(self):
+        api_stats = self._api_stats()
+        logging.info(f'CM360 API calls: {api_stats}')
+        self._write_run_metrics(api_stats)
+
+    def _api_stats(self) -> dict:
+        """API call counters of the run, summed over the synchronous and (if used) the async client."""
+        stats = Counter(self.google_client.api_stats)
+        if self.async_google_client:
+            stats.update(self.async_google_client.api_stats)
+        return dict(stats)
+
+    def _write_run_metrics(self, api_stats: dict):
+        """Writes the run metrics into a JSON file uploaded to Storage files and logs their summary."""
+        clients = [self.google_client] + ([self.async_google_client] if self.async_google_client else [])
+        for client in clients:
+            for profile_id, calls in client.profile_api_calls.items():
+                self.metrics.count(profile_id, api_calls=calls)
+        os.makedirs(self.files_out_path, exist_ok=True)
+        metrics_file = self.create_out_file_definition(METRICS_FILE_NAME, tags=['cm360-run-metrics'])
+        self.metrics.write(metrics_file.full_path, api_calls=api_stats)
+        self.write_manifest(metrics_file)
+        logging.info(self.metrics.summary())
 
     def _create_date_range(self) -> dict:
         if self.cfg.time_range.period == 'CUSTOM_DATES':
@@ -182,62 +271,192 @@ class Component(ComponentBase):
             }
         return date_range
 
-    def _get_report_raw_file_path(self, profile_id, report_id) -> str:
-        path = f'{self.files_out_path}/{profile_id}_{report_id}.raw'
-        return path
+    def _split_date_range(self, date_range: dict) -> List[dict]:
+        """
+        Splits a custom date range into chunks of `time_range.chunk_days` days, each run as a separate report file.
+
+        Returns: List of date ranges, a single item if chunking is not applicable
+
+        """
+        chunk_days = self.cfg.time_range.chunk_days
+        if not chunk_days or chunk_days <= 0 or not date_range.get('startDate'):
+            return [date_range]
+
+        date_ranges = split_date_range(date.fromisoformat(date_range['startDate']),
+                                       date.fromisoformat(date_range['endDate']), chunk_days)
+        logging.info(f'Date range {date_range["startDate"]} - {date_range["endDate"]} split into '
+                     f'{len(date_ranges)} chunk(s) of {chunk_days} day(s)')
+        return date_ranges
+
+    def _get_profile_date_range(self, profile_id: str, date_range: dict) -> dict:
+        """
+        Narrows the configured date range of a profile to the days not extracted yet, based on the watermark
+        (last fully extracted date) of the profile in state. The last `time_range.restatement_days` days before
+        the watermark are extracted again to pick up restated data.
+        Registers the watermark to be stored once all files of the profile are downloaded.
+
+        Returns: Absolute date range of the profile, the configured date range if watermarks are not used
+
+        """
+        if not self.cfg.time_range.use_watermark:
+            return date_range
+
+        today = date.today()
+        resolved = resolve_date_range(date_range, today)
+        if not resolved:
+            logging.warning(f'Date range {date_range["relativeDateRange"]} cannot be used with watermarks, '
+                            f'the whole period is extracted')
+            return date_range
+
+        start, end = resolved
+        watermark = self.watermarks.get(profile_id)
+        if watermark:
+            restatement_days = max(self.cfg.time_range.restatement_days, 0)
+            start = max(start, date.fromisoformat(watermark) + timedelta(days=1 - restatement_days))
+            # always extract at least the last day of the period
+            start = min(start, end)
+            logging.info(f'Profile {profile_id} extracted up to {watermark}, '
+                         f'extracting {start.isoformat()} - {end.isoformat()}')
+        # the current day is never complete
+        self.pending_watermarks[profile_id] = min(end, today - timedelta(days=1)).isoformat()
+        return custom_date_range(start, end)
+
+    def _advance_watermarks(self, report_files: List[Dict[str, str]]):
+        """Stores pending watermarks of profiles that have report files and all of them were downloaded successfully."""
+        downloaded = {rf['profile_id'] for rf in report_files}
+        downloaded -= {rf['profile_id'] for rf in report_files if not rf.get('header')}
+        for profile_id, watermark in self.pending_watermarks.items():
+            if profile_id not in downloaded:
+                logging.warning(f'Watermark of profile {profile_id} is not advanced, its report did not finish')
+                continue
+            self.watermarks[profile_id] = watermark
+
+    def _update_profile_history(self, report_files: List[Dict[str, str]]):
+        """Records queue time, size and download time of profiles whose report files were all downloaded."""
+        incomplete = {rf['profile_id'] for rf in report_files if not rf.get('header') or rf.get('reused')}
+        profiles = self.metrics.to_dict()['profiles']
+        for profile_id in {rf['profile_id'] for rf in report_files} - incomplete:
+            profile = profiles.get(profile_id, {})
+            self.history.update(profile_id, queue_s=profile.get('queue_wait_s', 0),
+                                download_s=profile.get('download_s', 0), size_bytes=profile.get('bytes', 0))
+
+    def _prune_profile_state(self, profile_ids: Set[str]):
+        """Drops watermarks and history of profiles no longer extracted, so the state does not grow with them."""
+        self.watermarks = {profile_id: watermark for profile_id, watermark in self.watermarks.items()
+                           if profile_id in profile_ids}
+        self.history.retain(profile_ids)
 
     def _get_final_directory(self) -> str:
+        if self._parquet_output:
+            # Storage tables are loaded from CSV only, Parquet slices are uploaded as files
+            return self.files_out_path
         path = f'{self.tables_out_path}/{self.cfg.destination.table_name}.csv'
         return path
 
-    def _get_final_file_path(self, profile_id, report_id) -> str:
-        path = f'{self._get_final_directory()}/{profile_id}_{report_id}.csv'
+    def _get_final_file_path(self, profile_id, report_id, chunk: int = None) -> str:
+        suffix = f'_{chunk}' if chunk is not None else ''
+        if self._parquet_output:
+            return f'{self._get_final_directory()}/{self.cfg.destination.table_name}_{profile_id}_{report_id}' \
+                   f'{suffix}.parquet'
+        extension = 'csv.gz' if self.cfg.destination.compress_slices else 'csv'
+        path = f'{self._get_final_directory()}/{profile_id}_{report_id}{suffix}.{extension}'
         return path
 
-    def _retrieve_table_from_raw(self, profile_id, profile_name, report_id) -> list:
-        in_file = self._get_report_raw_file_path(profile_id=profile_id, report_id=report_id)
-        out_file = self._get_final_file_path(profile_id=profile_id, report_id=report_id)
-        logging.debug(f'Processing raw file {in_file}')
-        with open(in_file, 'rt') as src, open(out_file, 'wt') as tgt:
-            csv_src = csv.reader(src, delimiter=',')
-            csv_tgt = csv.writer(tgt, delimiter=',', lineterminator='\n')
-            for row in csv_src:
-                if row == ['Report Fields']:
-                    break
+    @property
+    def _parquet_output(self) -> bool:
+        return self.cfg.destination.output_format == OutputFormat.PARQUET
 
-            header = next(csv_src)
-            header.insert(0, 'profileName')
-            header.insert(0, 'profileId')
+    def _open_report_slice(self, out_file: str):
+        if self._parquet_output:
+            columns = ['profileId', 'profileName'] + self.common_dimensions + self.common_metrics
+            return ParquetSliceWriter(out_file, columns, metric_columns=len(self.common_metrics))
+        return open_slice(out_file, compress=self.cfg.destination.compress_slices)
 
-            for row in csv_src:
-                if row[0] == 'Grand Total:':
-                    break
-                row.insert(0, profile_name)
-                row.insert(0, profile_id)
-                csv_tgt.writerow(row)
+    def _download_report_slice(self, report_file: dict, chunks: Iterator[bytes] = None) -> list:
+        """
+        Streams the report file directly into the final table slice, without an intermediate raw file.
+
+        Args:
+            report_file: Report file to download
+            chunks: Content of the file, downloaded by the synchronous client if not set
+
+        Returns: Header of the slice
+
+        """
+        profile_id, report_id, file_id = report_file['profile_id'], report_file['report_id'], report_file['file_id']
+        out_file = self._get_final_file_path(profile_id=profile_id, report_id=report_id, chunk=report_file.get('chunk'))
+        if chunks is None:
+            chunks = self.google_client.iter_report_file(
+                report_id=report_id, file_id=file_id,
+                chunk_size=self.cfg.performance.download_chunk_size_mb * 1024 * 1024)
+        stats = {}
+        transform = transform_report_rows if self._parquet_output else transform_report_stream_fast
+        with closing(chunks), self._open_report_slice(out_file) as tgt:
+            try:
+                header = transform(
+                    self._tracked_chunks(chunks, profile_id), tgt, profile_id=profile_id,
+                    profile_name=report_file['profile_name'], stats=stats,
+                    on_header=functools.partial(self._validate_report_header, report_file))
+            except ValueError as ex:
+                # ReportFormatError, or a metric value that is not a number in a Parquet slice
+                raise UserException(f'Report {report_id} of profile {profile_id}: {ex}') from ex
+        self.metrics.count(profile_id, rows=stats['rows'], files=1)
 
         logging.debug(f'Final table file {out_file} was saved')
         return header
 
+    def _tracked_chunks(self, chunks: Iterable[bytes], profile_id: str) -> Iterator[bytes]:
+        """Counts downloaded bytes of the profile and interrupts the download when the run is being aborted."""
+        for chunk in chunks:
+            if self._abort.is_set():
+                raise DownloadAborted()
+            self.metrics.count(profile_id, bytes=len(chunk))
+            yield chunk
+
+    def _validate_report_header(self, report_file: dict, header: list):
+        """
+        Validates the header of a report file as soon as it is streamed, before its rows are downloaded.
+        The header must have a column for each common dimension and metric and match headers of other files.
+        """
+        expected_columns = len(self.common_dimensions) + len(self.common_metrics)
+        if len(header) != expected_columns:
+            raise UserException(f'Report {report_file["report_id"]} of profile {report_file["profile_id"]} has '
+                                f'{len(header)} columns {header}, expected {expected_columns} columns of dimensions '
+                                f'{self.common_dimensions} and metrics {self.common_metrics}')
+        with self._header_lock:
+            if self._first_header is None:
+                self._first_header = header
+            elif header != self._first_header:
+                raise UserException(f'missmatch in headers found: {self._first_header} x {header} '
+                                    f'(report {report_file["report_id"]} of profile {report_file["profile_id"]})')
+
     def init_configuration(self):
         self.cfg: Configuration = Configuration.load_from_dict(self.configuration.parameters)
 
         if not self.cfg.destination.table_name and self.cfg.input_variant != InputVariant.METADATA:
             raise UserException("Destination table name is missing!")
 
+        if self.cfg.time_range.use_watermark and not self.cfg.destination.incremental_loading:
+            raise UserException("Extraction from the last watermark requires incremental load type, "
+                                "full load would drop the previously extracted days.")
+
     def _process_report_files(self, report_files: list):
-        os.makedirs(self._get_final_directory(), exist_ok=True)
+        unfinished = [f'report {rf["report_id"]} file {rf["file_id"]} of profile {rf["profile_id"]}: '
+                      f'{rf.get("status", "not checked")}' for rf in report_files if not rf.get('header')]
+        if unfinished:
+            # the output would miss the data of these profiles, a full load would drop them from the table
+            raise UserException(f'{len(unfinished)} report file(s) failed or were cancelled: ' + ', '.join(unfinished))
         header = []
         for rf in report_files:
-            cur_header = self._retrieve_table_from_raw(rf['profile_id'], rf['profile_name'], rf['report_id'])
-            # header_normalizer = DefaultHeaderNormalizer()
-            # cur_header = header_normalizer.normalize_header(cur_header)
+            cur_header = rf.get('header')
             if not header:
                 header = cur_header
             else:
                 if header != cur_header:
                     raise UserException(f'missmatch in headers found: {header} x {cur_header}')
 
+        if not header:
+            raise UserException('No report finished successfully')
         return header
 
     def _assign_profile_names(self, report_files: list):
@@ -260,25 +479,354 @@ class Component(ComponentBase):
                                                         columns=dimensions + metrics)
         self.write_manifest(result_table)
 
-    def _wait_process_report_files(self, wait_files):
-        report_files = []
-        for report_file in wait_files:
-            profile_id, report_id, file_id = report_file['profile_id'], report_file['report_id'], \
-                report_file['file_id']
-            file = self.google_client.report_status(report_id=report_id, file_id=file_id)
+    def _write_parquet_manifests(self, report_files: list):
+        """Writes manifests of the Parquet slices, uploaded to Storage files tagged with the table name."""
+        for report_file in report_files:
+            if not report_file.get('header'):
+                continue
+            path = self._get_final_file_path(report_file['profile_id'], report_file['report_id'],
+                                             chunk=report_file.get('chunk'))
+            file_def = self.create_out_file_definition(os.path.basename(path),
+                                                       tags=['cm360-report', self.cfg.destination.table_name])
+            self.write_manifest(file_def)
+
+    def _run_reports(self, reports_2_run: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        Starts all reports concurrently, bounded by the configured number of workers.
+        Reports with multiple date range chunks are run once per chunk, updating the report date range in between.
+
+        Returns: List of report files (profile, report, file ids and chunk index) in the order of reports_2_run
+
+        """
+
+        def _run_report(item: Dict[str, str]) -> List[Dict[str, str]]:
+            profile_id = item['profile_id']
+            report_id = item['report_id']
+            date_ranges = item.get('date_ranges') or [None]
+            report_files = []
+            report = None
+            for chunk, date_range in enumerate(date_ranges):
+                if chunk > 0:
+                    report = self._update_report_date_range(profile_id, report_id, report, date_range)
+                # files run before a chunk update would not match the report, only the first chunk can be reused
+                report_file = self._find_reusable_file(profile_id, report_id, item.get('report')) if chunk == 0 \
+                    else None
+                if report_file:
+                    logging.info(f'Report {report_id} has a recent file {report_file["id"]} for '
+                                 f'{report_file["dateRange"]["startDate"]} - {report_file["dateRange"]["endDate"]}, '
+                                 f'the file is reused')
+                    report_files.append(dict(profile_id=profile_id, report_id=report_id, file_id=report_file['id'],
+                                             chunk=chunk if len(date_ranges) > 1 else None,
+                                             started_at=time.monotonic(), reused=True))
+                    continue
+                report_file = self.google_client.run_report(profile_id=profile_id, report_id=report_id)
+                if date_range:
+                    logging.info(f'Report {report_id} started for {date_range["startDate"]} - '
+                                 f'{date_range["endDate"]}')
+                else:
+                    logging.info(f'Report {report_id} started')
+                report_files.append(dict(profile_id=profile_id, report_id=report_id, file_id=report_file['id'],
+                                         chunk=chunk if len(date_ranges) > 1 else None,
+                                         started_at=time.monotonic()))
+            return report_files
+
+        def _run_profile_report(item: Dict[str, str]) -> List[Dict[str, str]]:
+            with self.metrics.phase('run', profile_id=item['profile_id']):
+                return _run_report(item)
+
+        with ThreadPoolExecutor(max_workers=self.cfg.performance.max_workers,
+                                thread_name_prefix='run') as executor:
+            return [report_file for report_files in executor.map(_run_profile_report, reports_2_run)
+                    for report_file in report_files]
+
+    def _find_reusable_file(self, profile_id: str, report_id: str, report: Optional[dict]) -> Optional[dict]:
+        """
+        Looks up an available file of the report that can be downloaded instead of running the report again.
+        The file must cover the current date range of the report, be generated after the last change of the report
+        and be at most `performance.reuse_file_max_age_min` minutes old.
+        Args:
+            profile_id:
+            report_id:
+            report: report resource fetched while preparing the reports, None for a report created in this run
+
+        Returns: Report file resource or None if no file can be reused
+
+        """
+        max_age_min = self.cfg.performance.reuse_file_max_age_min
+        if not max_age_min or max_age_min <= 0 or not report:
+            return None
+
+        report = CsvReportSpecification(report)
+        resolved = resolve_date_range(report.report_criteria['dateRange'], date.today())
+        if not resolved:
+            return None
+        start, end = resolved
+        modified_after_ms = max(int(report.report_representation.get('lastModifiedTime') or 0),
+                                int((time.time() - max_age_min * 60) * 1000))
+        return self.google_client.find_available_file(profile_id, report_id, start_date=start.isoformat(),
+                                                      end_date=end.isoformat(), modified_after_ms=modified_after_ms)
+
+    def _update_report_date_range(self, profile_id: str, report_id: str, report: dict, date_range: dict) -> dict:
+        """
+        Sets a new date range of a generated report before its next chunk is run.
+        Args:
+            profile_id:
+            report_id:
+            report: current report resource, retrieved if not known yet
+            date_range: new date range
+
+        Returns: Updated report resource
+
+        """
+        if not report:
+            report = self.google_client.get_report(profile_id=profile_id, report_id=report_id)
+        existing_report = CsvReportSpecification(report)
+        chunk_definition = CsvReportSpecification(copy.deepcopy(report))
+        chunk_definition.modify_date_range(date_range=date_range)
+        updated_report = self.google_client.update_report(report=existing_report.prepare_update_body(chunk_definition),
+                                                          profile_id=profile_id, report_id=report_id)
+        self.report_fingerprints[profile_id] = dict(fingerprint=chunk_definition.fingerprint(),
+                                                    etag=updated_report.get('etag'))
+        return updated_report
+
+    def _wait_download_report_files(self, report_files: List[Dict[str, str]]):
+        """
+        Polls all report files until they are finished. Each file is checked on its own adaptive schedule, files due
+        at the same time are checked in batch requests. Available files are downloaded in background workers,
+        so a large file does not hold up status checks and downloads of the other profiles.
+        A failed download (e.g. a header not matching the report columns) aborts the run right away: running files
+        are no longer checked, pending downloads are cancelled and downloads in progress are interrupted.
+        """
+        performance = self.cfg.performance
+        scheduler = ReportPollScheduler(initial_delay=performance.poll_initial_delay_s,
+                                        max_delay=performance.poll_max_delay_s)
+        for report_file in report_files:
+            # reused files are already available, there is no reason to wait for the first check
+            scheduler.add(report_file['file_id'], report_file, started_at=report_file.get('started_at'),
+                          first_check_delay=0 if report_file.get('reused') else None)
+        os.makedirs(self._get_final_directory(), exist_ok=True)
+
+        download_workers = self.history.download_workers([rf['profile_id'] for rf in report_files],
+                                                         performance.max_workers)
+        with ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix='download') as download_pool:
+            downloads = []
+            while scheduler and not self._abort.is_set():
+                # a failed download interrupts the wait
+                if self._abort.wait(min(scheduler.seconds_to_next_check(), self.deadline.wait_time_left())):
+                    break
+                if self.deadline.exceeded:
+                    self._on_deadline_exceeded()
+                    break
+                due_files = scheduler.pop_due()
+                logging.info(f'Checking {len(due_files)} of {len(scheduler)} running report(s)')
+                self._wait_process_report_files(due_files, scheduler, download_pool, downloads)
+
+            if not self._abort.is_set():
+                logging.info(f'Waiting for {len(downloads)} report download(s) to finish')
+                try:
+                    for download in as_completed(downloads, timeout=self.deadline.wait_time_left()
+                                                 if self.deadline.enabled else None):
+                        # re-raises any download error
+                        download.result()
+                except FuturesTimeoutError:
+                    self._on_deadline_exceeded()
+
+            if self._abort.is_set():
+                # CM360 has no endpoint to cancel a running report file, they are only no longer polled
+                logging.warning(f'Aborting the run, {len(scheduler)} running report(s) are no longer checked and '
+                                f'pending downloads are cancelled')
+                download_pool.shutdown(wait=True, cancel_futures=True)
+                self._raise_download_error(downloads)
+
+    def _on_deadline_exceeded(self):
+        """Stops waiting for the reports, the run finishes with the files downloaded so far and then fails."""
+        logging.warning(f'The run exceeded its time budget of {self.deadline.budget_s / 60:g} min')
+        self._deadline_exceeded = True
+        self._abort.set()
+
+    def _deadline_summary(self, reports_2_run: List[Dict[str, str]], report_files: List[Dict[str, str]]) -> str:
+        unfinished = {}
+        for report_file in report_files:
+            if not report_file.get('header'):
+                unfinished.setdefault(report_file['profile_id'], []).append(
+                    f'report {report_file["report_id"]} file {report_file["file_id"]}: '
+                    f'{report_file.get("status", "not checked")}')
+        # reports that were not even started
+        started = {report_file['profile_id'] for report_file in report_files}
+        for item in reports_2_run:
+            if item['profile_id'] not in started:
+                unfinished.setdefault(item['profile_id'], []).append(f'report {item["report_id"]}: not started')
+        profiles = '\n'.join(f'- profile {profile_id} ({", ".join(files)})' for profile_id, files in unfinished.items())
+        return (f'The run exceeded its time budget of {self.deadline.budget_s / 60:g} min (run_timeout_min), '
+                f'reports of {len(unfinished)} profile(s) did not finish:\n{profiles}\n'
+                f'The state was saved, the unfinished report files were abandoned (CM360 cannot cancel them).')
+
+    def _on_download_done(self, download: Future):
+        if not download.cancelled() and download.exception():
+            self._abort.set()
+
+    @staticmethod
+    def _raise_download_error(downloads: List[Future]):
+        """Re-raises the error that caused the abort, not the errors of downloads interrupted by it."""
+        for download in downloads:
+            try:
+                download.result()
+            except (DownloadAborted, CancelledError):
+                continue
+
+    def _download_report_file(self, report_file: dict, file_format: str, latency: Dict[str, float],
+                              chunks: Iterator[bytes] = None):
+        download_start = time.monotonic()
+        report_file['header'] = self._download_report_slice(report_file, chunks)
+        download_time = time.monotonic() - download_start
+        # the transform runs in the same pass, so the download time includes it
+        self.metrics.add_duration('queue_wait', latency['report_available'], profile_id=report_file['profile_id'])
+        self.metrics.add_duration('download', download_time, profile_id=report_file['profile_id'])
+        logging.debug(f'Report file {report_file["file_id"]} in format {file_format} was processed')
+        logging.info(f'Report {report_file["report_id"]} of profile {report_file["profile_id"]}: '
+                     f'processing started after {latency.get("processing", 0):.1f} s, '
+                     f'available after {latency["report_available"]:.1f} s, '
+                     f'downloaded in {download_time:.1f} s')
+
+    def _wait_process_report_files(self, due_files: list, scheduler: ReportPollScheduler,
+                                   download_pool: ThreadPoolExecutor, downloads: list):
+        statuses = self.google_client.report_statuses([(scheduler.item(file_id)['report_id'], file_id)
+                                                       for file_id in due_files])
+
+        def _download_order(item: tuple) -> float:
+            expected = self.history.expected_download(scheduler.item(item[0])['profile_id'])
+            return -math.inf if expected is None else -expected
+
+        # files available at the same time are downloaded from the one expected to take longest
+        for file_id, file in sorted(statuses.items(), key=_download_order):
+            report_file = scheduler.item(file_id)
+            report_id = report_file['report_id']
             status = file['status']
+            report_file['status'] = status
             # Available statuses: PROCESSING|REPORT_AVAILABLE|FAILED|CANCELLED|QUEUED
             if status == 'REPORT_AVAILABLE':
-                file_name = self._get_report_raw_file_path(profile_id, report_id)
-                self.google_client.get_report_file(report_id=report_id, file_id=file_id, local_file_name=file_name)
-                logging.debug(f'Report file {file_name} in format {file["format"]} was saved')
+                latency = scheduler.finish(file_id, status)
+                download = download_pool.submit(self._download_report_file, report_file, file['format'], latency)
+                download.add_done_callback(self._on_download_done)
+                downloads.append(download)
             elif status == 'FAILED' or status == 'CANCELLED':
-                logging.info(f'Report {report_id} failed or canceled')
+                scheduler.finish(file_id, status)
+                logging.warning(f'Report {report_id} failed or canceled')
             else:
                 logging.debug(f'Report {file["reportId"]} : {status}')
-                report_files.append(report_file)
+                scheduler.reschedule(file_id, status)
 
-        return report_files
+    def _run_wait_download_async(self, reports_2_run: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        Runs, polls and downloads all reports in a single event loop using the async client. Every report is
+        driven by its own coroutine, so the number of reports in flight is not bound by threads, only
+        `performance.max_workers` downloads (and transforms, which run in worker threads) run at the same time.
+        The first failure cancels all other report lifecycles and interrupts downloads in progress.
+
+        Returns: List of report files (profile, report, file ids, chunk index and header) in the order of reports_2_run
+
+        """
+        if self.cfg.performance.reuse_file_max_age_min > 0:
+            logging.warning('Reusing recent report files is not supported with async_io, all reports are run')
+        try:
+            return asyncio.run(self._run_report_lifecycles(reports_2_run))
+        except BaseExceptionGroup as group:
+            # the failure that cancelled the other lifecycles
+            raise next(ex for ex in group.exceptions if not isinstance(ex, DownloadAborted))
+
+    async def _run_report_lifecycles(self, reports_2_run: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        self.async_google_client = self._create_async_google_client()
+        scheduler = ReportPollScheduler(initial_delay=self.cfg.performance.poll_initial_delay_s,
+                                        max_delay=self.cfg.performance.poll_max_delay_s)
+        download_slots = asyncio.Semaphore(self.history.download_workers(
+            [item['profile_id'] for item in reports_2_run], self.cfg.performance.max_workers))
+        os.makedirs(self._get_final_directory(), exist_ok=True)
+        # report files of each report, filled in as the reports are run, so they are known even after a timeout
+        report_files = [[] for _ in reports_2_run]
+        async with self.async_google_client as client:
+            profile_names = await client.list_profiles()
+            try:
+                async with asyncio.timeout(self.deadline.wait_time_left() if self.deadline.enabled else None):
+                    async with asyncio.TaskGroup() as group:
+                        for item, item_files in zip(reports_2_run, report_files):
+                            group.create_task(self._report_lifecycle(client, item, item_files, profile_names,
+                                                                     scheduler, download_slots))
+            except TimeoutError:
+                self._on_deadline_exceeded()
+        return [report_file for item_files in report_files for report_file in item_files]
+
+    async def _report_lifecycle(self, client: AsyncGoogleCM360Client, item: Dict[str, str], report_files: list,
+                                profile_names: dict, scheduler: ReportPollScheduler,
+                                download_slots: asyncio.Semaphore):
+        """
+        Runs all date range chunks of a report, then waits for and downloads their files concurrently.
+        The started report files are appended to `report_files`.
+        """
+        profile_id, report_id = item['profile_id'], item['report_id']
+        date_ranges = item.get('date_ranges') or [None]
+        try:
+            with self.metrics.phase('run', profile_id=profile_id):
+                report = None
+                for chunk, date_range in enumerate(date_ranges):
+                    if chunk > 0:
+                        report = await self._update_report_date_range_async(client, profile_id, report_id, report,
+                                                                            date_range)
+                    report_file = await client.run_report(profile_id=profile_id, report_id=report_id)
+                    logging.info(f'Report {report_id} started' + (f' for {date_range["startDate"]} - '
+                                                                  f'{date_range["endDate"]}' if date_range else ''))
+                    report_files.append(dict(profile_id=profile_id, report_id=report_id, file_id=report_file['id'],
+                                             chunk=chunk if len(date_ranges) > 1 else None,
+                                             profile_name=profile_names.get(profile_id, profile_id)))
+            await asyncio.gather(*(self._wait_download_report_file_async(client, report_file, scheduler,
+                                                                         download_slots)
+                                   for report_file in report_files))
+        except Exception:
+            # interrupts downloads of the other reports running in worker threads
+            self._abort.set()
+            raise
+
+    async def _update_report_date_range_async(self, client: AsyncGoogleCM360Client, profile_id: str, report_id: str,
+                                              report: dict, date_range: dict) -> dict:
+        """Async variant of `_update_report_date_range`."""
+        if not report:
+            report = await client.get_report(profile_id=profile_id, report_id=report_id)
+        existing_report = CsvReportSpecification(report)
+        chunk_definition = CsvReportSpecification(copy.deepcopy(report))
+        chunk_definition.modify_date_range(date_range=date_range)
+        updated_report = await client.update_report(report=existing_report.prepare_update_body(chunk_definition),
+                                                    profile_id=profile_id, report_id=report_id)
+        self.report_fingerprints[profile_id] = dict(fingerprint=chunk_definition.fingerprint(),
+                                                    etag=updated_report.get('etag'))
+        return updated_report
+
+    async def _wait_download_report_file_async(self, client: AsyncGoogleCM360Client, report_file: dict,
+                                               scheduler: ReportPollScheduler, download_slots: asyncio.Semaphore):
+        """Polls a single report file on its own schedule and downloads it once it is available."""
+        report_id, file_id = report_file['report_id'], report_file['file_id']
+        scheduler.add(file_id, report_file)
+        while True:
+            await asyncio.sleep(scheduler.seconds_to_check(file_id))
+            file = await client.report_status(report_id=report_id, file_id=file_id,
+                                              profile_id=report_file['profile_id'])
+            status = file['status']
+            report_file['status'] = status
+            if status == 'REPORT_AVAILABLE':
+                latency = scheduler.finish(file_id, status)
+                break
+            if status == 'FAILED' or status == 'CANCELLED':
+                scheduler.finish(file_id, status)
+                logging.warning(f'Report {report_id} failed or canceled')
+                return
+            logging.debug(f'Report {report_id} : {status}')
+            scheduler.reschedule(file_id, status)
+
+        async with download_slots:
+            chunks = client.iter_report_file(report_id=report_id, file_id=file_id,
+                                             profile_id=report_file['profile_id'],
+                                             chunk_size=self.cfg.performance.download_chunk_size_mb * 1024 * 1024)
+            # the transform is CPU bound, it runs in a worker thread pulling the chunks from the event loop
+            await asyncio.to_thread(self._download_report_file, report_file, file['format'], latency,
+                                    _iter_async_chunks(chunks, asyncio.get_running_loop()))
 
     def _process_generated_reports(self) -> List[Dict[str, str]]:
         """
@@ -295,28 +843,90 @@ class Component(ComponentBase):
         self.common_dimensions = report_definition.get_dimensions_names()
         self.common_metrics = report_definition.get_metrics_names()
 
-        current_reports = {}
+        # each profile gets its own date range (watermarks), reports are prepared with the first chunk,
+        # following chunks are set just before they are run
+        profile_definitions = {}
+        profile_date_ranges = {}
         for profile_id in self.cfg.profiles:
-            existing_report_def = self._get_existing_report_for_profile(profile_id)
-
-            if existing_report_def:
-                current_report_id = self._update_existing_report(profile_id, existing_report_def,
-                                                                 report_definition)
-            else:
+            profile_definition = CsvReportSpecification(copy.deepcopy(report_definition.report_representation))
+            date_range = self._get_profile_date_range(profile_id, report_definition.report_criteria['dateRange'])
+            profile_date_ranges[profile_id] = self._split_date_range(date_range)
+            profile_definition.modify_date_range(date_range=profile_date_ranges[profile_id][0])
+            profile_definitions[profile_id] = profile_definition
+
+        existing_reports = self._get_existing_reports_for_profiles(self.cfg.profiles)
+        # current report resources, used to look up reusable report files without fetching the reports again
+        report_resources = self._update_existing_reports(existing_reports, profile_definitions)
+        current_reports = {profile_id: report.report_id for profile_id, report in existing_reports.items()}
+        for profile_id in self.cfg.profiles:
+            if profile_id not in current_reports:
                 logging.info(f"Creating a new report in profile {profile_id}")
-                current_report_id = self._create_new_report(profile_id, report_definition)
-
-            # Register a report ID in current state
-            current_reports[profile_id] = current_report_id
+                # Register a report ID in current state
+                current_reports[profile_id] = self._create_new_report(profile_id, profile_definitions[profile_id])
         """
             We now have current set of reports in current_reports dictionary
             Let's remove any report that will not be re-used in case a profile has been removed from the config.
         """
-        for profile_id, report_id in self.existing_reports_cache.items():
-            if profile_id not in current_reports or report_id != current_reports[profile_id]:
-                self.google_client.delete_report(profile_id=profile_id, report_id=report_id, ignore_error=True)
-
-        return [dict(profile_id=key, report_id=value) for key, value in current_reports.items()]
+        stale_reports = [(profile_id, report_id) for profile_id, report_id in self.existing_reports_cache.items()
+                         if profile_id not in current_reports or report_id != current_reports[profile_id]]
+        # reports of removed profiles are tracked in pending deletions until they are deleted
+        for profile_id, _ in stale_reports:
+            if profile_id not in current_reports:
+                self.existing_reports_cache.pop(profile_id, None)
+                self.report_fingerprints.pop(profile_id, None)
+        self._start_stale_reports_cleanup(stale_reports, in_use=set(current_reports.values()))
+
+        return [dict(profile_id=profile_id, report_id=current_reports[profile_id],
+                     date_ranges=profile_date_ranges[profile_id] if len(profile_date_ranges[profile_id]) > 1 else None,
+                     report=report_resources.get(profile_id))
+                for profile_id in self.cfg.profiles]
+
+    def _start_stale_reports_cleanup(self, stale_reports: List[Tuple[str, str]], in_use: Set[str]):
+        """
+        Deletes stale reports, together with the deletions that failed in previous runs, in a background worker,
+        so that the deletion does not hold up running of the reports. See `_finish_stale_reports_cleanup`.
+        """
+        reports = list(dict.fromkeys(stale_reports + [tuple(report) for report in self.pending_deletions]))
+        reports = [(profile_id, report_id) for profile_id, report_id in reports if report_id not in in_use]
+        self.pending_deletions = reports
+        if not reports:
+            return
+        logging.info(f'Deleting {len(reports)} stale report(s) in background')
+        self._cleanup = cleanup = Future()
+
+        def _delete():
+            cleanup.set_running_or_notify_cancel()
+            try:
+                cleanup.set_result(self.google_client.delete_reports(reports, ignore_error=True))
+            except Exception as ex:
+                cleanup.set_exception(ex)
+
+        # a daemon thread, the interpreter does not wait for an unfinished deletion at exit
+        threading.Thread(target=_delete, name='cleanup', daemon=True).start()
+
+    def _finish_stale_reports_cleanup(self):
+        """
+        Waits at most `performance.cleanup_timeout_s` seconds for the background deletion of stale reports.
+        Reports that were not deleted stay in `pending_deletions` and are deleted in the next run.
+        """
+        if not self._cleanup:
+            return
+        try:
+            deleted = self._cleanup.result(timeout=self.cfg.performance.cleanup_timeout_s)
+        except FuturesTimeoutError:
+            logging.warning(f'Deletion of {len(self.pending_deletions)} stale report(s) did not finish in time, '
+                            f'it will be retried in the next run')
+            return
+        except Exception as ex:
+            logging.warning(f'Deletion of stale reports failed, it will be retried in the next run: {ex}')
+            return
+        finally:
+            self._cleanup = None
+
+        self.pending_deletions = [report for report in self.pending_deletions if not deleted.get(report)]
+        if self.pending_deletions:
+            logging.warning(f'{len(self.pending_deletions)} stale report(s) could not be deleted, '
+                            f'the deletion will be retried in the next run')
 
     def _process_existing_reports(self) -> List[Dict[str, str]]:
         """
@@ -356,7 +966,8 @@ class Component(ComponentBase):
                 errors.append(f'Missmatch in report format {report_spec.report_representation.get("format")} '
                               f'for profile {profile_id} / report {report_id}')
 
-            reports_2_process.append(dict(profile_id=profile_id, report_id=report_id))
+            reports_2_process.append(dict(profile_id=profile_id, report_id=report_id,
+                                          report=report_spec.report_representation))
         if errors:
             raise UserException('\n'.join(errors))
         return reports_2_process
@@ -365,30 +976,45 @@ class Component(ComponentBase):
         report_response = self.google_client.get_report(profile_id=profile_id, report_id=report_id)
         return CsvReportSpecification(report_response)
 
-    def _update_existing_report(self, profile_id: str, existing_report: CsvReportSpecification,
-                                report_definition: CsvReportSpecification) -> str:
+    def _update_existing_reports(self, existing_reports: Dict[str, CsvReportSpecification],
+                                 report_definitions: Dict[str, CsvReportSpecification]) -> Dict[str, str]:
         """
-        Updates existing report definition based on the new definition (user or template)
+        Updates existing report definitions based on the new definition (user or template) in batch requests.
+        Reports whose definition did not change since the last update (same fingerprint and remote etag in state)
+        are not updated.
         Args:
-            profile_id:
-            existing_report:
-            new_report:
+            existing_reports: existing report of each profile
+            report_definitions: new definition of each profile
 
-        Returns: ID of existing report
+        Returns: mapping of profile ID -> current resource of the existing report
 
         """
-        logging.info(f"Updating an existing report in profile {profile_id}")
-        # Report is available - check whether it needs a patch
-        logging.debug(f'Report will be re-used {existing_report.report_id} for {profile_id}')
-
-        updated_report_body = existing_report.prepare_update_body(report_definition)
-
-        logging.debug(f'Report will be updated {updated_report_body}')
-
-        self.google_client.update_report(report=updated_report_body,
-                                         profile_id=profile_id,
-                                         report_id=existing_report.report_id)
-        return existing_report.report_id
+        fingerprints = {profile_id: report_definitions[profile_id].fingerprint() for profile_id in existing_reports}
+        updates = []
+        for profile_id, existing_report in existing_reports.items():
+            fingerprint = fingerprints[profile_id]
+            last_update = self.report_fingerprints.get(profile_id) or {}
+            if last_update.get('fingerprint') == fingerprint and last_update.get('etag') == existing_report.etag:
+                logging.info(f"The existing report in profile {profile_id} is up to date")
+                continue
+
+            logging.info(f"Updating an existing report in profile {profile_id}")
+            # Report is available - check whether it needs a patch
+            logging.debug(f'Report will be re-used {existing_report.report_id} for {profile_id}')
+
+            updated_report_body = existing_report.prepare_update_body(report_definitions[profile_id])
+
+            logging.debug(f'Report will be updated {updated_report_body}')
+            updates.append((profile_id, existing_report.report_id, updated_report_body))
+
+        resources = {profile_id: report.report_representation for profile_id, report in existing_reports.items()}
+        if updates:
+            updated_reports = self.google_client.update_reports(updates)
+            for (profile_id, _), updated_report in updated_reports.items():
+                self.report_fingerprints[profile_id] = dict(fingerprint=fingerprints[profile_id],
+                                                            etag=updated_report.get('etag'))
+                resources[profile_id] = updated_report
+        return resources
 
     def _create_new_report(self, profile_id: str, report_definition: CsvReportSpecification) -> str:
         """
@@ -404,30 +1030,36 @@ class Component(ComponentBase):
 
         report = self.google_client.create_report(new_report_body, profile_id=profile_id)
         self.existing_reports_cache[profile_id] = report['id']
+        self.report_fingerprints[profile_id] = dict(fingerprint=report_definition.fingerprint(),
+                                                    etag=report.get('etag'))
         logging.debug(f'New report {report["id"]} created for {profile_id}')
         return report['id']
 
-    def _get_existing_report_for_profile(self, profile_id: str) -> CsvReportSpecification:
+    def _get_existing_reports_for_profiles(self, profile_ids: List[str]) -> Dict[str, CsvReportSpecification]:
         """
-        Returns the existing report assinged to this profile and configuration if exists. None otherwise
+        Returns the existing reports assigned to these profiles and configuration if they exist.
         Args:
-            profile_id: profile_id to look in state
+            profile_ids: profile_ids to look in state
 
-        Returns: CsvReportSpecification
+        Returns: mapping of profile ID -> CsvReportSpecification
 
         """
-        existing_report_id = self.existing_reports_cache.get(profile_id)
-        if existing_report_id:
-            report_response = self.google_client.get_report(profile_id=profile_id, report_id=existing_report_id,
-                                                            ignore_error=True)
+        reports_2_get = [(profile_id, self.existing_reports_cache[profile_id]) for profile_id in profile_ids
+                         if self.existing_reports_cache.get(profile_id)]
+        if not reports_2_get:
+            return {}
+
+        existing_reports = {}
+        responses = self.google_client.get_reports(reports_2_get, ignore_error=True)
+        for (profile_id, existing_report_id), report_response in responses.items():
             if not report_response:
                 # Report is no longer available - remove it from the state and cancel the candidate ID
                 logging.warning(f"The report ID {existing_report_id} in state was deleted manually from the source!")
                 self.existing_reports_cache.pop(profile_id)
-                return None
-            return CsvReportSpecification(report_response)
-        else:
-            return None
+                self.report_fingerprints.pop(profile_id, None)
+                continue
+            existing_reports[profile_id] = CsvReportSpecification(report_response)
+        return existing_reports
 
     def _get_report_definition(self) -> CsvReportSpecification:
         """Method creates a report definition based either on a report specification found in parameters
@@ -467,9 +1099,25 @@ class Component(ComponentBase):
             self.configuration.oauth_credentials.appSecret,
             self.configuration.oauth_credentials.data,
             self.configuration.oauth_credentials.data["scope"].split(" "),
+            **self._get_rate_limits()
         )
         self.google_client = client
 
+    def _create_async_google_client(self) -> AsyncGoogleCM360Client:
+        return AsyncGoogleCM360Client(
+            self.configuration.oauth_credentials.appKey,
+            self.configuration.oauth_credentials.appSecret,
+            self.configuration.oauth_credentials.data,
+            self.configuration.oauth_credentials.data["scope"].split(" "),
+            **self._get_rate_limits()
+        )
+
+    def _get_rate_limits(self) -> dict:
+        # sync actions do not load the configuration dataclass
+        performance = self.cfg.performance if self.cfg else Performance()
+        return dict(requests_per_second=performance.requests_per_second,
+                    profile_requests_per_second=performance.profile_requests_per_second)
+
     @staticmethod
     def download_file(url: str, result_file_path: str):
         # avoid loading all into memory
@@ -537,12 +1185,18 @@ class Component(ComponentBase):
                 return report.get('format', 'CSV') == 'CSV'
             return True
 
+        def _list_reports(profile_id: str) -> List[dict]:
+            return self.google_client.list_reports(profile_id=profile_id, fields=['id', 'name', 'format'])
+
         self._init_google_client()
         profiles_2_names = self.google_client.list_profiles()
-        reports_w_labels = []
-        for profile_id in profile_ids:
-            reports = self.google_client.list_reports(profile_id=profile_id)
+        # sync actions do not load the configuration dataclass
+        performance = self.cfg.performance if self.cfg else Performance()
+        with ThreadPoolExecutor(max_workers=performance.max_workers, thread_name_prefix='list') as executor:
+            profile_reports = list(executor.map(_list_reports, profile_ids))
 
+        reports_w_labels = []
+        for profile_id, reports in zip(profile_ids, profile_reports):
             reports_w_labels.extend([SelectElement(value=f'{profile_id}:{report["id"]}',
                                                    label=f'[{profiles_2_names[profile_id]}] '
                                                          f'{report["name"]} ({profile_id}:{report["id"]})')
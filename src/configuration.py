@@ -20,12 +20,19 @@ class FilterPair:
     value: str
 
 
+class OutputFormat(str, Enum):
+    CSV = "csv"
+    PARQUET = "parquet"
+
+
 @dataclass
 class Destination:
     table_name: str = ""
     incremental_loading: bool = True
     primary_key: list[str] = None
     primary_key_existing: list[str] = None
+    compress_slices: bool = False
+    output_format: OutputFormat = OutputFormat.CSV
 
 
 @dataclass
@@ -33,6 +40,9 @@ class TimeRange:
     period: str = ""
     date_from: str = ""
     date_to: str = ""
+    chunk_days: int = 0
+    use_watermark: bool = False
+    restatement_days: int = 3
 
 
 @dataclass
@@ -42,6 +52,20 @@ class ReportSettings:
     metrics: list[str] = None
 
 
+@dataclass
+class Performance:
+    max_workers: int = 8
+    download_chunk_size_mb: int = 8
+    poll_initial_delay_s: float = 2.0
+    poll_max_delay_s: float = 60.0
+    requests_per_second: float = 10.0
+    profile_requests_per_second: float = 5.0
+    reuse_file_max_age_min: float = 0
+    cleanup_timeout_s: float = 30.0
+    async_io: bool = False
+    run_timeout_min: float = 0
+
+
 class ConfigurationBase:
 
     @staticmethod
@@ -98,5 +122,6 @@ class Configuration(ConfigurationBase):
     report_specification: ReportSettings = field(default_factory=lambda: ConfigTree({}))
     existing_report_ids: list[str] = field(default_factory=lambda: "")
     report_template_id: str = ""
+    performance: Performance = field(default_factory=Performance)
 
     debug: bool = False
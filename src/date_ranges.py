@@ -0,0 +1,72 @@
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+LAST_N_DAYS = {
+    'LAST_7_DAYS': 7,
+    'LAST_14_DAYS': 14,
+    'LAST_30_DAYS': 30,
+    'LAST_60_DAYS': 60,
+    'LAST_90_DAYS': 90,
+    'LAST_365_DAYS': 365
+}
+
+
+def custom_date_range(start: date, end: date) -> dict:
+    return {'relativeDateRange': None, 'startDate': start.isoformat(), 'endDate': end.isoformat()}
+
+
+def resolve_date_range(date_range: dict, today: date) -> Optional[Tuple[date, date]]:
+    """
+    Resolves a CM360 report date range into absolute start and end dates (both inclusive).
+
+    Relative ranges are resolved as described in the CM360 API reference, using `today` as the current day.
+
+    Returns: (start, end) or None if the relative range is not supported
+
+    """
+    if date_range.get('startDate') and date_range.get('endDate'):
+        return date.fromisoformat(date_range['startDate']), date.fromisoformat(date_range['endDate'])
+
+    period = date_range.get('relativeDateRange')
+    yesterday = today - timedelta(days=1)
+    if period in LAST_N_DAYS:
+        return today - timedelta(days=LAST_N_DAYS[period]), yesterday
+    if period == 'TODAY':
+        return today, today
+    if period == 'YESTERDAY':
+        return yesterday, yesterday
+    if period == 'WEEK_TO_DATE':
+        # weeks start on Sunday
+        return today - timedelta(days=(today.weekday() + 1) % 7), today
+    if period == 'MONTH_TO_DATE':
+        return today.replace(day=1), today
+    if period == 'QUARTER_TO_DATE':
+        return _quarter_start(today), today
+    if period == 'YEAR_TO_DATE':
+        return today.replace(month=1, day=1), today
+    if period == 'PREVIOUS_WEEK':
+        week_start = today - timedelta(days=(today.weekday() + 1) % 7)
+        return week_start - timedelta(days=7), week_start - timedelta(days=1)
+    if period == 'PREVIOUS_MONTH':
+        month_end = today.replace(day=1) - timedelta(days=1)
+        return month_end.replace(day=1), month_end
+    if period == 'PREVIOUS_QUARTER':
+        quarter_end = _quarter_start(today) - timedelta(days=1)
+        return _quarter_start(quarter_end), quarter_end
+    if period == 'PREVIOUS_YEAR':
+        return date(today.year - 1, 1, 1), date(today.year - 1, 12, 31)
+    return None
+
+
+def split_date_range(start: date, end: date, chunk_days: int) -> List[dict]:
+    """Splits an absolute date range into custom date ranges of `chunk_days` days."""
+    date_ranges = []
+    while start <= end:
+        chunk_end = min(end, start + timedelta(days=chunk_days - 1))
+        date_ranges.append(custom_date_range(start, chunk_end))
+        start = chunk_end + timedelta(days=1)
+    return date_ranges
+
+
+def _quarter_start(day: date) -> date:
+    return date(day.year, 3 * ((day.month - 1) // 3) + 1, 1)
@@ -1 +1,2 @@
+from .async_client import AsyncGoogleCM360Client  # noqa F401
 from .client import GoogleCM360Client, GoogleDV360ClientException  # noqa F401
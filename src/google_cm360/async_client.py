@@ -0,0 +1,297 @@
+import asyncio
+import logging
+import random
+import re
+import time
+from collections import Counter
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import quote
+
+import aiohttp
+import httplib2
+from google.auth.transport.requests import Request
+from google_auth_oauthlib.flow import Flow
+from googleapiclient.errors import HttpError
+
+from .client import DEFAULT_DOWNLOAD_CHUNK_SIZE, DOWNLOAD_MAX_ATTEMPTS, TOKEN_URI, GoogleDV360ClientException
+from .discovery_cache import load_discovery_document
+from .executor import (DEFAULT_BACKOFF_BASE, DEFAULT_BACKOFF_MAX, DEFAULT_MAX_RETRIES, RETRYABLE_STATUSES,
+                       is_rate_limit_error, retry_after_seconds)
+
+# size of the shared connection pool
+DEFAULT_CONNECTION_LIMIT = 100
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=None, connect=30, sock_read=300)
+_PATH_PARAMETER = re.compile(r'{\+?(\w+)}')
+
+
+class AsyncTokenBucket:
+    """
+    Token bucket limiting the rate of requests of coroutines running in a single event loop.
+
+    Behaves like the thread-safe `TokenBucket`: a caller finding the bucket empty reserves its token and sleeps
+    until the token is refilled, so waiting callers are served in order.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    async def acquire(self, tokens: float = 1) -> float:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= tokens
+        wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class AsyncGoogleCM360Client:
+    """
+    asyncio counterpart of `GoogleCM360Client` for runs driving many reports at once.
+
+    All requests share a single aiohttp session with a pooled connector, so thousands of concurrent report
+    lifecycles cost coroutines instead of threads. URLs are resolved from the same discovery document as the
+    synchronous client. Rate limits and retries follow `RequestExecutor`: project and profile token buckets,
+    exponential backoff with jitter respecting `Retry-After`, non-idempotent calls retried only when rate limited.
+    Failed calls raise `HttpError`, the same as the synchronous client.
+
+    Use as an async context manager, the session is created on enter and closed on exit.
+    """
+
+    def __init__(self, client_id: str, app_secret: str, token_data: dict, scopes: list,
+                 requests_per_second: float = 0, profile_requests_per_second: float = 0, root_url: str = None,
+                 token_uri: str = TOKEN_URI, connection_limit: int = DEFAULT_CONNECTION_LIMIT,
+                 max_retries: int = DEFAULT_MAX_RETRIES):
+        token_response = dict(token_data, expires_at=22222)
+        client_secrets = {
+            "web": {
+                "client_id": client_id,
+                "client_secret": app_secret,
+                "redirect_uris": ["https://www.example.com/oauth2callback"],
+                "auth_uri": "https://oauth2.googleapis.com/auth",
+                "token_uri": token_uri
+            }
+        }
+        self._credentials = Flow.from_client_config(client_secrets, scopes=scopes, token=token_response).credentials
+        self.discovery_document = load_discovery_document()
+        root_url = root_url or self.discovery_document['rootUrl']
+        self._base_url = root_url + self.discovery_document['servicePath']
+        self._connection_limit = connection_limit
+        self._max_retries = max_retries
+        self._project_bucket = AsyncTokenBucket(requests_per_second) if requests_per_second > 0 else None
+        self._profile_rate = profile_requests_per_second
+        self._profile_buckets: Dict[str, AsyncTokenBucket] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._refresh_lock: Optional[asyncio.Lock] = None
+        self._stats = Counter()
+        self._profile_calls = Counter()
+
+    async def __aenter__(self) -> 'AsyncGoogleCM360Client':
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self._connection_limit),
+                                              timeout=REQUEST_TIMEOUT)
+        self._refresh_lock = asyncio.Lock()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+        self._session = None
+
+    @property
+    def api_stats(self) -> dict:
+        """Counters of API calls, throttled, rate limited and retried calls."""
+        return dict(self._stats)
+
+    @property
+    def profile_api_calls(self) -> Dict[str, int]:
+        """Number of API calls made for each profile."""
+        return dict(self._profile_calls)
+
+    async def list_profiles(self) -> dict:
+        """Call API to retrieve available profiles
+
+        Returns: mapping of profileId -> userName
+
+        """
+        response = await self._call('userProfiles', 'list')
+        return {p['profileId']: p['userName'] for p in response['items']}
+
+    async def list_metadata(self, profile_id: str, endpoint_name: str) -> AsyncIterator[dict]:
+        """Call API to retrieve items of a metadata endpoint, page by page
+
+        Returns: async iterator of endpoint items
+
+        """
+        page_token = None
+        while True:
+            query = {'pageToken': page_token} if page_token else None
+            response = await self._call(endpoint_name, 'list', profile_id=profile_id, query=query,
+                                        profileId=profile_id)
+            for item in response.get(endpoint_name, []):
+                yield item
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+
+    async def get_report(self, report_id: str, profile_id: str) -> dict:
+        return await self._call('reports', 'get', profile_id=profile_id, profileId=profile_id, reportId=report_id)
+
+    async def create_report(self, report: dict, profile_id: str) -> dict:
+        return await self._call('reports', 'insert', profile_id=profile_id, body=report, idempotent=False,
+                                profileId=profile_id)
+
+    async def update_report(self, report: dict, report_id: str, profile_id: str) -> dict:
+        return await self._call('reports', 'update', profile_id=profile_id, body=report, profileId=profile_id,
+                                reportId=report_id)
+
+    async def run_report(self, report_id: str, profile_id: str) -> dict:
+        return await self._call('reports', 'run', profile_id=profile_id, idempotent=False, profileId=profile_id,
+                                reportId=report_id)
+
+    async def report_status(self, report_id: str, file_id: str, profile_id: str = None) -> dict:
+        return await self._call('files', 'get', profile_id=profile_id, reportId=report_id, fileId=file_id)
+
+    async def iter_report_file(self, report_id: str, file_id: str, offset: int = 0, profile_id: str = None,
+                               chunk_size: int = DEFAULT_DOWNLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """Streams the content of a report file, resuming with a Range request when the connection drops.
+
+        Args:
+            report_id: Report ID
+            file_id: Report file ID
+            offset: Number of leading bytes to skip (e.g. already downloaded part of the file)
+            profile_id: Profile the download is counted to in the profile rate limit
+            chunk_size: Maximum size of the yielded chunks in bytes
+
+        Returns: Async iterator of file content chunks
+
+        """
+        url = self._url('files', 'get', reportId=report_id, fileId=file_id)
+        attempt = 0
+        while True:
+            await self._throttle(profile_id)
+            headers = await self._auth_headers()
+            if offset:
+                headers['Range'] = f'bytes={offset}-'
+            retry_after = None
+            try:
+                async with self._session.get(url, params={'alt': 'media'}, headers=headers) as response:
+                    if response.status == 416:
+                        # the requested range starts at the end of the file - nothing left to download
+                        return
+                    if response.status in RETRYABLE_STATUSES:
+                        retry_after = retry_after_seconds(response.headers)
+                        error = f'HTTP {response.status}'
+                    else:
+                        if response.status >= 400:
+                            raise await self._http_error(response)
+                        # the server may ignore the Range header and send the whole file again
+                        skip = offset if response.status != 206 else 0
+                        async for chunk in response.content.iter_chunked(chunk_size):
+                            if skip:
+                                if len(chunk) <= skip:
+                                    skip -= len(chunk)
+                                    continue
+                                chunk = chunk[skip:]
+                                skip = 0
+                            offset += len(chunk)
+                            yield chunk
+                        return
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as ex:
+                error = repr(ex)
+            attempt += 1
+            if attempt >= DOWNLOAD_MAX_ATTEMPTS:
+                raise GoogleDV360ClientException(f'Download of report {report_id} file {file_id} failed '
+                                                 f'after {attempt} attempts: {error}')
+            self._stats['retried'] += 1
+            logging.warning(f'Download of report {report_id} file {file_id} interrupted at byte {offset}, '
+                            f'resuming (attempt {attempt}): {error}')
+            await asyncio.sleep(retry_after or self._backoff_delay(attempt))
+
+    def _url(self, resource: str, method: str, **path_params) -> str:
+        path = self._method(resource, method)['path']
+        return self._base_url + _PATH_PARAMETER.sub(lambda match: quote(str(path_params[match.group(1)]), safe=''),
+                                                    path)
+
+    def _method(self, resource: str, method: str) -> dict:
+        return self.discovery_document['resources'][resource]['methods'][method]
+
+    async def _call(self, resource: str, method: str, profile_id: str = None, body: dict = None,
+                    query: dict = None, idempotent: bool = True, **path_params) -> dict:
+        http_method = self._method(resource, method)['httpMethod']
+        url = self._url(resource, method, **path_params)
+        method_id = f'{resource}.{method}'
+        attempt = 0
+        refreshed = False
+        while True:
+            await self._throttle(profile_id)
+            try:
+                self._stats['calls'] += 1
+                async with self._session.request(http_method, url, params=query, json=body,
+                                                 headers=await self._auth_headers()) as response:
+                    if response.status < 400:
+                        return await response.json(content_type=None)
+                    error = await self._http_error(response)
+                if error.resp.status == 401 and not refreshed:
+                    # the access token expired while the request was in flight
+                    refreshed = True
+                    await self._refresh_credentials(force=True)
+                    continue
+                rate_limited = is_rate_limit_error(error)
+                if rate_limited:
+                    self._stats['rate_limited'] += 1
+                retryable = rate_limited or (idempotent and error.resp.status in RETRYABLE_STATUSES)
+                if not retryable or attempt >= self._max_retries:
+                    raise error
+                delay = retry_after_seconds(error.resp) or self._backoff_delay(attempt)
+                message = f'HTTP {error.resp.status} {error.reason}'
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as ex:
+                if not idempotent or attempt >= self._max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                message = repr(ex)
+            attempt += 1
+            self._stats['retried'] += 1
+            logging.warning(f'CM360 API request {method_id} failed ({message}), '
+                            f'retrying in {delay:.1f} s (attempt {attempt}/{self._max_retries})')
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    async def _http_error(response: aiohttp.ClientResponse) -> HttpError:
+        headers = {key.lower(): value for key, value in response.headers.items()}
+        resp = httplib2.Response(dict(headers, status=str(response.status)))
+        resp.reason = response.reason
+        return HttpError(resp, await response.read(), uri=str(response.url))
+
+    async def _auth_headers(self) -> dict:
+        if not self._credentials.valid:
+            await self._refresh_credentials()
+        return {'Authorization': f'Bearer {self._credentials.token}'}
+
+    async def _refresh_credentials(self, force: bool = False):
+        token = self._credentials.token
+        async with self._refresh_lock:
+            # the token may have been refreshed by another coroutine meanwhile
+            if self._credentials.token != token or (self._credentials.valid and not force):
+                return
+            # google-auth refreshes synchronously, the blocking call runs in a worker thread
+            await asyncio.to_thread(self._credentials.refresh, Request())
+
+    async def _throttle(self, profile_id: Optional[str] = None):
+        if profile_id:
+            self._profile_calls[profile_id] += 1
+        waited = 0.0
+        if self._project_bucket:
+            waited += await self._project_bucket.acquire()
+        if profile_id and self._profile_rate > 0:
+            bucket = self._profile_buckets.setdefault(profile_id, AsyncTokenBucket(self._profile_rate))
+            waited += await bucket.acquire()
+        if waited:
+            self._stats['throttled'] += 1
+
+    @staticmethod
+    def _backoff_delay(attempt: int) -> float:
+        delay = min(DEFAULT_BACKOFF_MAX, DEFAULT_BACKOFF_BASE * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
@@ -1,23 +1,58 @@
 # import http
-import io
-
+import threading
+import time
+from concurrent.futures import Executor
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple
+
+import google_auth_httplib2
+import requests
+from google.auth.transport.requests import AuthorizedSession
 from google_auth_oauthlib.flow import Flow
 from googleapiclient import discovery
 from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaIoBaseDownload
+from googleapiclient.http import build_http
 from keboola.component.exceptions import UserException
 
+from .discovery_cache import load_discovery_document
+from .executor import RETRYABLE_STATUSES, RequestExecutor, is_rate_limit_error, retry_after_seconds
+
 from datetime import datetime
 
 import logging
 
 
+# maximum number of calls in a single batch request recommended by Google APIs
+BATCH_LIMIT = 100
+DEFAULT_DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+DOWNLOAD_MAX_ATTEMPTS = 5
+# (connect, read) timeouts of a media download request in seconds
+DOWNLOAD_TIMEOUT = (30, 300)
+TOKEN_URI = 'https://oauth2.googleapis.com/token'
+
+
 class GoogleDV360ClientException(UserException):
     pass
 
 
+def expected_file_size(status: int, headers) -> Optional[int]:
+    """Returns the size of the whole file announced by a media download response, None if it is not known.
+
+    The size is taken from the total of the Content-Range of a partial (206) response, otherwise from the
+    Content-Length. It is not known for compressed or chunked responses.
+    """
+    if headers.get('Content-Encoding', 'identity') != 'identity':
+        return None
+    if status == 206:
+        total = (headers.get('Content-Range') or '').rpartition('/')[2]
+        return int(total) if total.isdigit() else None
+    length = headers.get('Content-Length') or ''
+    return int(length) if length.isdigit() else None
+
+
 class GoogleCM360Client:
-    def __init__(self, client_id: str, app_secret: str, token_data: dict, scopes: list):
+    def __init__(self, client_id: str, app_secret: str, token_data: dict, scopes: list,
+                 requests_per_second: float = 0, profile_requests_per_second: float = 0, root_url: str = None,
+                 token_uri: str = TOKEN_URI):
         self.service = None
         token_response = token_data
         token_response['expires_at'] = 22222
@@ -27,19 +62,105 @@ class GoogleCM360Client:
                 "client_secret": app_secret,
                 "redirect_uris": ["https://www.example.com/oauth2callback"],
                 "auth_uri": "https://oauth2.googleapis.com/auth",
-                "token_uri": "https://oauth2.googleapis.com/token"
+                "token_uri": token_uri
             }
         }
 
         credentials = Flow.from_client_config(client_secrets, scopes=scopes, token=token_response).credentials
-        discovery_url = 'https://dfareporting.googleapis.com/$discovery/rest?version=v4'
-        # Build the API service.
-        self.service = discovery.build(
-            'dfareporting', 'v4',
-            discoveryServiceUrl=discovery_url,
-            credentials=credentials)
+        self._credentials = credentials
+        self._local = threading.local()
+        self._executor = RequestExecutor(self._get_http, project_rate=requests_per_second,
+                                         profile_rate=profile_requests_per_second)
+        # Build the API service from the locally available discovery document.
+        self.discovery_document = load_discovery_document()
+        if root_url:
+            # e.g. a local stand-in server, batch requests use the root URL so it is replaced in the document
+            self.discovery_document = dict(self.discovery_document, rootUrl=root_url,
+                                           baseUrl=root_url + self.discovery_document['servicePath'])
+        self.service = discovery.build_from_document(self.discovery_document, credentials=credentials)
         logging.info(f'{datetime.now().strftime("%H:%M:%S.%f")[:-3]} Google DV360 client initialized')
 
+    def _get_http(self) -> google_auth_httplib2.AuthorizedHttp:
+        """Returns an authorized HTTP transport owned by the calling thread.
+
+        httplib2 connections are not thread-safe, so each worker thread gets its own transport
+        sharing the same credentials. `build_http` sets the default socket timeout of Google API clients,
+        so a stalled call fails (and is retried) instead of blocking the thread.
+        """
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = google_auth_httplib2.AuthorizedHttp(self._credentials, http=build_http())
+            self._local.http = http
+        return http
+
+    def _get_session(self) -> AuthorizedSession:
+        """Returns an authorized requests session owned by the calling thread, used for streamed media downloads."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = AuthorizedSession(self._credentials)
+            self._local.session = session
+        return session
+
+    def _execute(self, request, profile_id: str = None, idempotent: bool = True):
+        """Executes the request through the central executor handling rate limits and retries."""
+        return self._executor.execute(request, profile_id=profile_id, idempotent=idempotent)
+
+    def _execute_batch(self, requests: Dict[Hashable, tuple], max_retries: int = 3) -> Dict[Hashable, object]:
+        """Executes requests grouped into batch requests of up to BATCH_LIMIT calls.
+
+        Calls failing with a rate limit or a transient error are retried in the next batch.
+
+        Args:
+            requests: mapping of key -> (request, profile_id)
+            max_retries: maximum number of retries of a single call
+
+        Returns: mapping of key -> response, or HttpError if the call failed
+
+        """
+        results = {}
+        pending = dict(requests)
+        attempt = 0
+        while pending:
+            failed = {}
+            keys = list(pending)
+            for start in range(0, len(keys), BATCH_LIMIT):
+                batch_keys = keys[start:start + BATCH_LIMIT]
+
+                def _callback(request_id, response, exception):
+                    key = batch_keys[int(request_id)]
+                    if exception is not None and attempt < max_retries and (
+                            is_rate_limit_error(exception) or exception.resp.status in RETRYABLE_STATUSES):
+                        failed[key] = pending[key]
+                    else:
+                        results[key] = exception if exception is not None else response
+
+                batch = self.service.new_batch_http_request(callback=_callback)
+                for index, key in enumerate(batch_keys):
+                    request, profile_id = pending[key]
+                    self._executor.throttle(profile_id)
+                    batch.add(request, request_id=str(index))
+                self._executor.execute(batch, tokens=0)
+
+            pending = failed
+            if pending:
+                attempt += 1
+                for _ in pending:
+                    self._executor.count_retry()
+                delay = self._executor.backoff_delay(attempt)
+                logging.warning(f'{len(pending)} call(s) of a batch request failed, retrying in {delay:.1f} s')
+                time.sleep(delay)
+        return results
+
+    @property
+    def api_stats(self) -> dict:
+        """Counters of API calls, throttled, rate limited and retried calls."""
+        return self._executor.stats
+
+    @property
+    def profile_api_calls(self) -> Dict[str, int]:
+        """Number of API calls made for each profile."""
+        return self._executor.profile_calls
+
     def list_profiles(self) -> dict:
         """Call API to retrieve available profiles
 
@@ -47,33 +168,57 @@ class GoogleCM360Client:
 
         """
         request = self.service.userProfiles().list()
-        response = request.execute()
+        response = self._execute(request)
         id_2_name = dict([(p['profileId'], p['userName']) for p in response['items']])
         return id_2_name
 
     def list_metadata(self, profile_id: str = None, endpoint_name: str = None):
-        """Call API to retrieve available profiles
+        """Call API to retrieve items of a metadata endpoint
 
-        Returns: mapping of profileId -> userName
+        Returns: iterator of endpoint items
+
+        """
+        for page in self.list_metadata_pages(profile_id=profile_id, endpoint_name=endpoint_name):
+            yield from page
+
+    def list_metadata_pages(self, profile_id: str = None, endpoint_name: str = None,
+                            prefetch_executor: Executor = None) -> Iterator[list]:
+        """Call API to retrieve pages of items of a metadata endpoint
+
+        Args:
+            profile_id: Profile ID
+            endpoint_name: Metadata endpoint, e.g. campaigns
+            prefetch_executor: If set, the next page is requested in this executor
+                while the current page is being consumed
+
+        Returns: iterator of item lists
 
         """
+
+        def _get_page(page_token: str = None) -> dict:
+            request_args = {'profileId': profile_id}
+            if page_token is not None:
+                request_args['pageToken'] = page_token
+            return self._execute(getattr(self.service, endpoint_name)().list(**request_args), profile_id=profile_id)
+
         try:
-            next_page = None
+            next_response = prefetch_executor.submit(_get_page) if prefetch_executor else None
+            response = None if prefetch_executor else _get_page()
             while True:
+                if prefetch_executor:
+                    response = next_response.result()
 
-                request_args = {'profileId': profile_id}
-                if next_page is not None:
-                    request_args['pageToken'] = next_page
-
-                response = getattr(self.service, endpoint_name)().list(**request_args).execute()
+                next_page = response.get('nextPageToken')
+                if next_page and prefetch_executor:
+                    next_response = prefetch_executor.submit(_get_page, next_page)
 
                 if endpoint_name in response:
-                    for item in response[endpoint_name]:
-                        yield item
+                    yield response[endpoint_name]
 
-                next_page = response.get('nextPageToken')
                 if not next_page:
                     break
+                if not prefetch_executor:
+                    response = _get_page(next_page)
 
         except HttpError as ex:
             if ex.resp.status == 403:
@@ -82,20 +227,36 @@ class GoogleCM360Client:
         except Exception as ex:
             logging.warning(f'Listing metadata for {endpoint_name}: {ex}')
 
-    def list_reports(self, profile_id: str = None):
-        if not profile_id:
-            profile_id = self.service.userProfiles().list().execute()['items'][0]['profileId']
+    def list_reports(self, profile_id: str = None, fields: List[str] = None) -> List[dict]:
+        """Call API to retrieve all reports of the profile, following the result pages
+
+        Args:
+            profile_id: Profile ID, the first available profile if not set
+            fields: If set, only these fields of the reports are requested (partial response)
 
-        request = self.service.reports().list(profileId=profile_id)
-        response = request.execute()
-        return response['items']
+        Returns: list of report resources
+
+        """
+        if not profile_id:
+            profile_id = self._execute(self.service.userProfiles().list())['items'][0]['profileId']
+
+        request_args = {'profileId': profile_id}
+        if fields:
+            request_args['fields'] = f'nextPageToken,items({",".join(fields)})'
+        reports = []
+        while True:
+            response = self._execute(self.service.reports().list(**request_args), profile_id=profile_id)
+            reports.extend(response.get('items', []))
+            if not response.get('nextPageToken'):
+                return reports
+            request_args['pageToken'] = response['nextPageToken']
 
     def get_report(self, report_id: str, profile_id: str = None, ignore_error: bool = False):
         if not profile_id:
-            profile_id = self.service.userProfiles().list().execute()['items'][0]['profileId']
+            profile_id = self._execute(self.service.userProfiles().list())['items'][0]['profileId']
         request = self.service.reports().get(profileId=profile_id, reportId=report_id)
         try:
-            response = request.execute()
+            response = self._execute(request, profile_id=profile_id)
         except HttpError as ex:
             if ignore_error:
                 return None
@@ -106,7 +267,7 @@ class GoogleCM360Client:
     def delete_report(self, report_id: str, profile_id: str, ignore_error: bool = False):
         request = self.service.reports().delete(profileId=profile_id, reportId=report_id)
         try:
-            response = request.execute()
+            response = self._execute(request, profile_id=profile_id)
         except HttpError as ex:
             if ignore_error:
                 return None
@@ -115,41 +276,204 @@ class GoogleCM360Client:
         return response
 
     def patch_report(self, report: dict, report_id: str, profile_id: str):
-        response = self.service.reports().delete(profileId=profile_id, reportId=report_id, body=report).execute()
+        response = self._execute(self.service.reports().delete(profileId=profile_id, reportId=report_id, body=report),
+                                 profile_id=profile_id)
         return response
 
     def update_report(self, report: dict, report_id: str, profile_id: str):
-        response = self.service.reports().update(profileId=profile_id, reportId=report_id, body=report).execute()
+        response = self._execute(self.service.reports().update(profileId=profile_id, reportId=report_id, body=report),
+                                 profile_id=profile_id)
         return response
 
     def list_compatible_fields(self, report_type: str = "STANDARD", compat_fields: str = "reportCompatibleFields",
                                attribute: str = "dimensions", profile_id: str = None):
         if not profile_id:
-            profile_id = self.service.userProfiles().list().execute()['items'][0]['profileId']
+            profile_id = self._execute(self.service.userProfiles().list())['items'][0]['profileId']
 
         request = self.service.reports().compatibleFields().query(profileId=profile_id, body={"type": report_type})
-        response = request.execute()
+        response = self._execute(request, profile_id=profile_id)
 
         return [item['name'] for item in response[compat_fields][attribute]]
 
     def create_report(self, report: dict, profile_id: str = None):
-        inserted_report = self.service.reports().insert(profileId=profile_id, body=report).execute()
+        inserted_report = self._execute(self.service.reports().insert(profileId=profile_id, body=report),
+                                        profile_id=profile_id, idempotent=False)
         return inserted_report
 
     def run_report(self, report_id: str, profile_id: str):
-        report_file = self.service.reports().run(profileId=profile_id, reportId=report_id).execute()
+        report_file = self._execute(self.service.reports().run(profileId=profile_id, reportId=report_id),
+                                    profile_id=profile_id, idempotent=False)
         return report_file
 
     def report_status(self, report_id: str, file_id: str):
-        report_file = self.service.files().get(reportId=report_id, fileId=file_id).execute()
+        report_file = self._execute(self.service.files().get(reportId=report_id, fileId=file_id))
         return report_file
 
-    def get_report_file(self, report_id: str, file_id: str, local_file_name: str):
-        out_file = io.FileIO(local_file_name, mode='wb')
-        request = self.service.files().get_media(reportId=report_id, fileId=file_id)
-        CHUNK_SIZE = 8192
-        downloader = MediaIoBaseDownload(
-            out_file, request, chunksize=CHUNK_SIZE)
-        download_finished = False
-        while download_finished is False:
-            _, download_finished = downloader.next_chunk()
+    def find_available_file(self, profile_id: str, report_id: str, start_date: str, end_date: str,
+                            modified_after_ms: int, max_results: int = 10) -> Optional[dict]:
+        """Looks up the most recent available file of the report for the given absolute date range.
+
+        Args:
+            profile_id:
+            report_id:
+            start_date: start of the date range (YYYY-MM-DD)
+            end_date: end of the date range (YYYY-MM-DD)
+            modified_after_ms: only files modified at or after this time (milliseconds since epoch) are considered
+            max_results: number of the most recent files checked
+
+        Returns: report file resource or None if there is no such file
+
+        """
+        request = self.service.reports().files().list(profileId=profile_id, reportId=report_id,
+                                                      maxResults=max_results, sortField='LAST_MODIFIED_TIME',
+                                                      sortOrder='DESCENDING')
+        response = self._execute(request, profile_id=profile_id)
+        for report_file in response.get('items', []):
+            if int(report_file.get('lastModifiedTime') or 0) < modified_after_ms:
+                # files are sorted from the most recent one
+                break
+            date_range = report_file.get('dateRange') or {}
+            if report_file.get('status') == 'REPORT_AVAILABLE' \
+                    and date_range.get('startDate') == start_date and date_range.get('endDate') == end_date:
+                return report_file
+        return None
+
+    def report_statuses(self, report_files: List[Tuple[str, str]]) -> Dict[str, dict]:
+        """Checks statuses of multiple report files using batch requests.
+
+        Args:
+            report_files: list of (report_id, file_id) pairs
+
+        Returns: mapping of file_id -> report file resource
+
+        """
+        requests = {file_id: (self.service.files().get(reportId=report_id, fileId=file_id), None)
+                    for report_id, file_id in report_files}
+        results = self._execute_batch(requests)
+        for file_id, result in results.items():
+            if isinstance(result, HttpError):
+                raise result
+        return results
+
+    def get_reports(self, reports: List[Tuple[str, str]], ignore_error: bool = False) -> Dict[Tuple[str, str], dict]:
+        """Retrieves multiple reports using batch requests.
+
+        Args:
+            reports: list of (profile_id, report_id) pairs
+            ignore_error: If True, None is returned for reports that cannot be retrieved
+
+        Returns: mapping of (profile_id, report_id) -> report resource
+
+        """
+        requests = {(profile_id, report_id): (self.service.reports().get(profileId=profile_id, reportId=report_id),
+                                              profile_id)
+                    for profile_id, report_id in reports}
+        results = self._execute_batch(requests)
+        for (profile_id, report_id), result in results.items():
+            if isinstance(result, HttpError):
+                if not ignore_error:
+                    raise UserException(f'Get report {report_id} for {profile_id}: {result.reason}')
+                results[(profile_id, report_id)] = None
+        return results
+
+    def update_reports(self, reports: List[Tuple[str, str, dict]]) -> Dict[Tuple[str, str], dict]:
+        """Updates multiple reports using batch requests.
+
+        Args:
+            reports: list of (profile_id, report_id, report body) triples
+
+        Returns: mapping of (profile_id, report_id) -> updated report resource
+
+        """
+        requests = {(profile_id, report_id): (self.service.reports().update(profileId=profile_id, reportId=report_id,
+                                                                            body=report),
+                                              profile_id)
+                    for profile_id, report_id, report in reports}
+        results = self._execute_batch(requests)
+        errors = [f'Error updating report {report_id} for {profile_id}: {result.reason}'
+                  for (profile_id, report_id), result in results.items() if isinstance(result, HttpError)]
+        if errors:
+            raise UserException('\n'.join(errors))
+        return results
+
+    def delete_reports(self, reports: List[Tuple[str, str]], ignore_error: bool = False) -> Dict[Tuple[str, str], bool]:
+        """Deletes multiple reports using batch requests.
+
+        Args:
+            reports: list of (profile_id, report_id) pairs
+            ignore_error: If True, failed deletions are only reported in the result
+
+        Returns: mapping of (profile_id, report_id) -> True if the report was deleted or did not exist
+
+        """
+        requests = {(profile_id, report_id): (self.service.reports().delete(profileId=profile_id, reportId=report_id),
+                                              profile_id)
+                    for profile_id, report_id in reports}
+        results = self._execute_batch(requests)
+        # a report that does not exist anymore is as good as deleted
+        failed = {key for key, result in results.items() if isinstance(result, HttpError) and result.resp.status != 404}
+        errors = [f'Error deleting report {report_id} for {profile_id}: {results[(profile_id, report_id)].reason}'
+                  for profile_id, report_id in failed]
+        if errors and not ignore_error:
+            raise UserException('\n'.join(errors))
+        return {key: key not in failed for key in results}
+
+    def iter_report_file(self, report_id: str, file_id: str, offset: int = 0,
+                         chunk_size: int = DEFAULT_DOWNLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+        """Streams the content of a report file in a single GET of the media URL.
+
+        When the connection drops (including a response body shorter than its announced size), the download is
+        resumed with a Range request from the last received byte.
+
+        Args:
+            report_id: Report ID
+            file_id: Report file ID
+            offset: Number of leading bytes to skip (e.g. already downloaded part of the file)
+            chunk_size: Size of the yielded chunks in bytes
+
+        Returns: Iterator of file content chunks
+
+        """
+        url = self.service.files().get_media(reportId=report_id, fileId=file_id).uri
+        attempt = 0
+        while True:
+            self._executor.throttle()
+            headers = {'Range': f'bytes={offset}-'} if offset else {}
+            retry_after = None
+            try:
+                with self._get_session().get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                    if response.status_code == 416:
+                        # the requested range starts at the end of the file - nothing left to download
+                        return
+                    if response.status_code in RETRYABLE_STATUSES:
+                        retry_after = retry_after_seconds(response.headers)
+                        error = f'HTTP {response.status_code}'
+                    else:
+                        response.raise_for_status()
+                        # the server may ignore the Range header and send the whole file again
+                        skip = offset if response.status_code != 206 else 0
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            if skip:
+                                if len(chunk) <= skip:
+                                    skip -= len(chunk)
+                                    continue
+                                chunk = chunk[skip:]
+                                skip = 0
+                            offset += len(chunk)
+                            yield chunk
+                        # urllib3 does not check the Content-Length, a dropped connection looks like the end of file
+                        file_size = expected_file_size(response.status_code, response.headers)
+                        if file_size is None or offset >= file_size:
+                            return
+                        error = f'connection closed after {offset} of {file_size} bytes'
+            except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.Timeout) as ex:
+                error = repr(ex)
+            attempt += 1
+            if attempt >= DOWNLOAD_MAX_ATTEMPTS:
+                raise GoogleDV360ClientException(f'Download of report {report_id} file {file_id} failed '
+                                                 f'after {attempt} attempts: {error}')
+            self._executor.count_retry()
+            logging.warning(f'Download of report {report_id} file {file_id} interrupted at byte {offset}, '
+                            f'resuming (attempt {attempt}): {error}')
+            time.sleep(retry_after or self._executor.backoff_delay(attempt))
@@ -0,0 +1,68 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import requests
+from googleapiclient.discovery_cache import get_static_doc
+
+API_NAME = 'dfareporting'
+API_VERSION = 'v4'
+DISCOVERY_URL = f'https://dfareporting.googleapis.com/$discovery/rest?version={API_VERSION}'
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'google-cm360-discovery')
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+_documents = {}
+_lock = threading.Lock()
+
+
+def load_discovery_document(cache_dir: str = DEFAULT_CACHE_DIR, ttl: int = DEFAULT_TTL_SECONDS) -> dict:
+    """
+    Returns the dfareporting discovery document without fetching it from the network whenever possible.
+
+    The document is looked up in this order: process memory, on-disk cache younger than `ttl` seconds,
+    the document bundled with google-api-python-client, the discovery service (result is stored in the on-disk cache)
+    and finally an expired on-disk cache.
+    """
+    with _lock:
+        document = _documents.get(API_VERSION)
+        if document is None:
+            document = json.loads(_load_document_content(cache_dir, ttl))
+            _documents[API_VERSION] = document
+        return document
+
+
+def _load_document_content(cache_dir: str, ttl: int) -> str:
+    cache_file = os.path.join(cache_dir, f'{API_NAME}.{API_VERSION}.json')
+    cache_age = time.time() - os.path.getmtime(cache_file) if os.path.exists(cache_file) else None
+    if cache_age is not None and cache_age < ttl:
+        logging.debug(f'Using cached discovery document {cache_file}')
+        return _read(cache_file)
+
+    content = get_static_doc(API_NAME, API_VERSION)
+    if content:
+        logging.debug('Using discovery document bundled with google-api-python-client')
+        return content
+
+    try:
+        response = requests.get(DISCOVERY_URL, timeout=60)
+        response.raise_for_status()
+    except requests.RequestException as ex:
+        if cache_age is None:
+            raise
+        logging.warning(f'Cannot fetch the discovery document, using expired cache {cache_file}: {ex}')
+        return _read(cache_file)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as file:
+        file.write(response.text)
+    os.replace(tmp_file, cache_file)
+    return response.text
+
+
+def _read(path: str) -> str:
+    with open(path, encoding='utf-8') as file:
+        return file.read()
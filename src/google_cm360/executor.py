@@ -0,0 +1,175 @@
+import email.utils
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = (b'rateLimitExceeded', b'userRateLimitExceeded', b'RATE_LIMIT_EXCEEDED')
+TRANSPORT_ERRORS = (ConnectionError, TimeoutError, httplib2.HttpLib2Error)
+
+DEFAULT_MAX_RETRIES = 6
+DEFAULT_BACKOFF_BASE = 1.0
+DEFAULT_BACKOFF_MAX = 64.0
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting the rate of requests.
+
+    Tokens are refilled continuously at `rate` per second up to `capacity`. A caller that finds the bucket empty
+    reserves its token anyway and sleeps until the token is refilled, so waiting callers are served in order.
+    """
+
+    def __init__(self, rate: float, capacity: float = None, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Takes tokens from the bucket, waiting if necessary.
+
+        Returns: Number of seconds the caller waited
+
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            self._sleep(wait)
+        return wait
+
+
+class RequestExecutor:
+    """
+    Central executor of all CM360 API requests.
+
+    Each request takes a token from the project-wide bucket and (when the request is bound to a profile)
+    from the bucket of its profile. Rate limited (429, 403 rate limit) and transient (5xx, transport) failures are
+    retried with exponential backoff and jitter, respecting the `Retry-After` header when the API sends one.
+    Non-idempotent requests are retried only when the API rejected them because of rate limits.
+    """
+
+    def __init__(self, http_factory: Callable[[], httplib2.Http], project_rate: float = 0, profile_rate: float = 0,
+                 max_retries: int = DEFAULT_MAX_RETRIES, backoff_base: float = DEFAULT_BACKOFF_BASE,
+                 backoff_max: float = DEFAULT_BACKOFF_MAX, sleep: Callable[[float], None] = time.sleep):
+        self._http_factory = http_factory
+        self._profile_rate = profile_rate
+        self._project_bucket = TokenBucket(project_rate, sleep=sleep) if project_rate > 0 else None
+        self._profile_buckets: Dict[str, TokenBucket] = {}
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._stats = Counter()
+        self._profile_calls = Counter()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Counters of executed calls, locally throttled calls, rate limited responses and retried calls."""
+        with self._lock:
+            return dict(self._stats)
+
+    @property
+    def profile_calls(self) -> Dict[str, int]:
+        """Number of calls bound to each profile, including calls in batch requests and retries."""
+        with self._lock:
+            return dict(self._profile_calls)
+
+    def execute(self, request, profile_id: str = None, idempotent: bool = True, tokens: int = 1):
+        attempt = 0
+        while True:
+            self.throttle(profile_id, tokens)
+            try:
+                self._count('calls')
+                return request.execute(http=self._http_factory())
+            except HttpError as ex:
+                rate_limited = is_rate_limit_error(ex)
+                if rate_limited:
+                    self._count('rate_limited')
+                retryable = rate_limited or (idempotent and ex.resp.status in RETRYABLE_STATUSES)
+                if not retryable or attempt >= self._max_retries:
+                    raise
+                delay = retry_after_seconds(ex.resp) or self.backoff_delay(attempt)
+                error = f'HTTP {ex.resp.status} {ex.reason}'
+            except TRANSPORT_ERRORS as ex:
+                if not idempotent or attempt >= self._max_retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+                error = repr(ex)
+            attempt += 1
+            self._count('retried')
+            logging.warning(f'CM360 API request {getattr(request, "methodId", "")} failed ({error}), '
+                            f'retrying in {delay:.1f} s (attempt {attempt}/{self._max_retries})')
+            self._sleep(delay)
+
+    def throttle(self, profile_id: Optional[str] = None, tokens: int = 1):
+        """Waits until the request fits into the project and profile rate limits."""
+        if not tokens:
+            return
+        if profile_id:
+            with self._lock:
+                self._profile_calls[profile_id] += tokens
+        waited = 0.0
+        if self._project_bucket:
+            waited += self._project_bucket.acquire(tokens)
+        if profile_id and self._profile_rate > 0:
+            waited += self._profile_bucket(profile_id).acquire(tokens)
+        if waited:
+            self._count('throttled')
+
+    def backoff_delay(self, attempt: int) -> float:
+        delay = min(self._backoff_max, self._backoff_base * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    def count_retry(self):
+        self._count('retried')
+
+    def _profile_bucket(self, profile_id: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._profile_buckets.get(profile_id)
+            if bucket is None:
+                bucket = TokenBucket(self._profile_rate, sleep=self._sleep)
+                self._profile_buckets[profile_id] = bucket
+            return bucket
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+
+def is_rate_limit_error(ex: HttpError) -> bool:
+    if ex.resp.status == 429:
+        return True
+    return ex.resp.status == 403 and any(reason in ex.content for reason in RATE_LIMIT_REASONS)
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    """Parses the Retry-After header given either in seconds or as an HTTP date."""
+    value = headers.get('retry-after') if headers else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
@@ -1,3 +1,6 @@
+import hashlib
+import json
+
 REPORT_KEBOOLA_BASE_STRUCTURE = {"name": "kebola-ex-generated",
                                  "fileName": "kebola-ex-file",
                                  "kind": "dfareporting#report",
@@ -21,6 +24,10 @@ MAP_REPORT_TYPE_2_CRITERIA = {
 }
 
 
+# fields assigned by the API or specific to a report instance - ignored when comparing report definitions
+VOLATILE_REPORT_FIELDS = ('id', 'ownerProfileId', 'accountId', 'etag', 'lastModifiedTime', 'kind')
+
+
 class CsvReportSpecification:
 
     def __init__(self, report_dict: dict):
@@ -75,6 +82,12 @@ class CsvReportSpecification:
             new_report_body.pop(key, None)
         return new_report_body
 
+    def fingerprint(self) -> str:
+        """Returns a canonical hash of the report definition. Volatile fields like etag are excluded."""
+        body = {key: value for key, value in self.report_representation.items() if key not in VOLATILE_REPORT_FIELDS}
+        canonical = json.dumps(body, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
     @property
     def report_type(self) -> str:
         return self.report_representation['type']
@@ -95,6 +108,10 @@ class CsvReportSpecification:
     def report_id(self, report_id: str):
         self.report_representation['id'] = report_id
 
+    @property
+    def etag(self) -> str:
+        return self.report_representation.get('etag')
+
     @property
     def profile_id(self) -> str:
         return self.report_representation['ownerProfileId']
@@ -0,0 +1,102 @@
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List
+
+from google_cm360 import GoogleCM360Client
+
+# maximum number of pages waiting in the queue of an endpoint writer
+QUEUE_SIZE = 32
+_END = object()
+
+
+class _EndpointWriter(threading.Thread):
+    """Single consumer writing all pages of an endpoint into its table. The writer is created with the first page."""
+
+    def __init__(self, endpoint: str, writer_factory: Callable[[str], object]):
+        super().__init__(name=f'writer-{endpoint}', daemon=True)
+        self.endpoint = endpoint
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.rows = 0
+        self.error = None
+        self._writer_factory = writer_factory
+
+    def run(self):
+        writer = None
+        try:
+            while (page := self.queue.get()) is not _END:
+                if writer is None:
+                    writer = self._writer_factory(self.endpoint)
+                for item in page:
+                    writer.writerow(item)
+                self.rows += len(page)
+        except Exception as ex:
+            self.error = ex
+            # keep consuming so that producers are not blocked on a full queue
+            while self.queue.get() is not _END:
+                pass
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+class MetadataExporter:
+    """
+    Exports metadata endpoints of multiple profiles concurrently.
+
+    A pool of workers lists all (endpoint, profile) pairs, reading the next page ahead while the current one is
+    being consumed. Pages are passed through a bounded queue to a single writer per endpoint table.
+    """
+
+    def __init__(self, client: GoogleCM360Client, max_workers: int = 8):
+        self._client = client
+        self._max_workers = max_workers
+
+    def export(self, endpoints: List[str], profile_ids: List[str],
+               writer_factory: Callable[[str], object]) -> Dict[str, int]:
+        """
+        Args:
+            endpoints: metadata endpoints to export
+            profile_ids: profiles to export the endpoints for
+            writer_factory: creates a writer (with writerow and close methods) of an endpoint table
+
+        Returns: Number of rows written per endpoint
+
+        """
+        writers = {endpoint: _EndpointWriter(endpoint, writer_factory) for endpoint in endpoints}
+        for writer in writers.values():
+            writer.start()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='metadata') as workers, \
+                    ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='prefetch') as prefetch:
+                futures = [workers.submit(self._export_profile, endpoint, profile_id, writers[endpoint], prefetch)
+                           for endpoint in endpoints for profile_id in profile_ids]
+                try:
+                    for future in as_completed(futures):
+                        future.result()
+                except BaseException:
+                    # do not start the queued exports, leaving the block waits for the running ones only
+                    workers.shutdown(wait=False, cancel_futures=True)
+                    raise
+        finally:
+            for writer in writers.values():
+                writer.queue.put(_END)
+            for writer in writers.values():
+                writer.join()
+
+        for writer in writers.values():
+            if writer.error:
+                raise writer.error
+        return {endpoint: writer.rows for endpoint, writer in writers.items()}
+
+    def _export_profile(self, endpoint: str, profile_id: str, writer: _EndpointWriter, prefetch: ThreadPoolExecutor):
+        logging.info(f'Listing metadata for {endpoint} in profile {profile_id}')
+        for page in self._client.list_metadata_pages(profile_id=profile_id, endpoint_name=endpoint,
+                                                     prefetch_executor=prefetch):
+            if not page:
+                continue
+            for item in page:
+                item['profile_id'] = profile_id
+            writer.queue.put(page)
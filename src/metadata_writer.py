@@ -0,0 +1,120 @@
+import csv
+import json
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+# nested objects are flattened up to this depth, deeper objects and all arrays are written as JSON
+MAX_DEPTH = 3
+COLUMN_SEPARATOR = '_'
+# JSON object with fields missing in the schema
+ADDITIONAL_FIELDS_COLUMN = 'additional_fields'
+LEADING_COLUMNS = ['profile_id', 'id']
+
+
+def endpoint_schema(document: dict, endpoint: str, max_depth: int = MAX_DEPTH) -> Optional[Tuple[list, set]]:
+    """
+    Derives the table schema of a metadata endpoint from the resource schemas of the discovery document.
+
+    Returns: (columns, flattened object paths) or None if the endpoint or its schema is not in the document
+
+    """
+    resource = document.get('resources', {}).get(endpoint, {})
+    response_ref = resource.get('methods', {}).get('list', {}).get('response', {}).get('$ref')
+    schemas = document.get('schemas', {})
+    items = schemas.get(response_ref, {}).get('properties', {}).get(endpoint, {}).get('items', {})
+    item_schema = schemas.get(items.get('$ref'))
+    if not item_schema or 'properties' not in item_schema:
+        return None
+
+    columns, objects = [], set()
+    _flatten_schema(schemas, item_schema, '', 1, max_depth, columns, objects)
+    return _ordered(columns), objects
+
+
+def _flatten_schema(schemas: dict, schema: dict, prefix: str, depth: int, max_depth: int, columns: list,
+                    objects: set):
+    for name, spec in schema['properties'].items():
+        column = prefix + name
+        spec = schemas.get(spec['$ref'], spec) if '$ref' in spec else spec
+        if spec.get('type') == 'object' and spec.get('properties') and depth < max_depth:
+            objects.add(column)
+            _flatten_schema(schemas, spec, column + COLUMN_SEPARATOR, depth + 1, max_depth, columns, objects)
+        else:
+            columns.append(column)
+
+
+def _ordered(columns: list) -> list:
+    return LEADING_COLUMNS + [column for column in columns if column not in LEADING_COLUMNS]
+
+
+class MetadataTableWriter:
+    """
+    Streams metadata items into a CSV table with a fixed set of columns, writing each row exactly once.
+
+    Nested objects are flattened into `parent_child` columns, arrays are written as JSON. The columns are either
+    derived from the discovery document (`endpoint_schema`) or discovered from the first written item. Fields
+    not known by the schema are kept as a JSON object in the `additional_fields` column.
+    """
+
+    def __init__(self, path: str, schema: Optional[Tuple[list, set]] = None, max_depth: int = MAX_DEPTH):
+        self._path = path
+        self._max_depth = max_depth
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._writer = csv.writer(self._file)
+        self._columns: Optional[List[str]] = None
+        self._indexes: Dict[str, int] = {}
+        self._objects: Set[str] = set()
+        self._unknown_fields: Set[str] = set()
+        if schema:
+            self._set_columns(*schema)
+
+    @property
+    def columns(self) -> Optional[List[str]]:
+        return self._columns
+
+    def writerow(self, item: dict):
+        if self._columns is None:
+            # no schema in the discovery document, the first item defines the columns
+            objects = set()
+            columns = list(self._flatten(item, expand_all=True, objects=objects))
+            self._set_columns(_ordered(columns), objects)
+
+        row = [''] * len(self._columns)
+        additional = {}
+        for column, value in self._flatten(item).items():
+            index = self._indexes.get(column)
+            if index is None:
+                additional[column] = value
+            else:
+                row[index] = json.dumps(value) if isinstance(value, (dict, list)) else value
+        if additional:
+            new_fields = additional.keys() - self._unknown_fields
+            if new_fields:
+                logging.debug(f'Fields {sorted(new_fields)} of {self._path} are not in the schema')
+                self._unknown_fields.update(new_fields)
+            row[-1] = json.dumps(additional)
+        self._writer.writerow(row)
+
+    def close(self):
+        if self._columns is None:
+            self._set_columns(LEADING_COLUMNS.copy(), set())
+        self._file.close()
+
+    def _set_columns(self, columns: list, objects: set):
+        self._columns = columns + [ADDITIONAL_FIELDS_COLUMN]
+        self._indexes = {column: index for index, column in enumerate(columns)}
+        self._objects = objects
+        self._writer.writerow(self._columns)
+
+    def _flatten(self, item: dict, expand_all: bool = False, objects: set = None, prefix: str = '',
+                 depth: int = 1) -> dict:
+        flat = {}
+        for name, value in item.items():
+            column = prefix + name
+            if isinstance(value, dict) and depth < self._max_depth and (expand_all or column in self._objects):
+                if objects is not None:
+                    objects.add(column)
+                flat.update(self._flatten(value, expand_all, objects, column + COLUMN_SEPARATOR, depth + 1))
+            else:
+                flat[column] = value
+        return flat
@@ -0,0 +1,85 @@
+import re
+from typing import List
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+DEFAULT_BATCH_ROWS = 32 * 1024
+DIMENSION_TYPE = pa.dictionary(pa.int32(), pa.string())
+# metrics counting events (impressions, clicks, video plays, reach, ...) are whole numbers written as int64, unless the
+# name says they are a ratio or an average; all other metrics (costs, revenues, conversions, times) are float64
+_COUNT_METRIC = re.compile(r'(Impressions|Clicks|Views|Plays|Replays|Completions|Completes|Midpoints|Mutes|Unmutes|'
+                           r'Pauses|Skips|Stops|Expansions|Interactions|Engagements|Scrolls|Closes|Exits|Serves|Reach|'
+                           r'Ads|Paths|Exposures|Transactions|TransactionCount|Visits)$')
+_RATIO_METRIC = re.compile(r'^percent|Percent|Rate|Average|Avg|Per[A-Z]|Frequency|Distribution')
+
+
+class ParquetSliceWriter:
+    """
+    Streams report rows into a Parquet file with typed columns, one row group per batch of `batch_rows` rows.
+
+    Dimension columns are written as dictionary encoded strings. Metric columns (the trailing `metric_columns`
+    columns) are written as int64 if the metric name marks a count (see `metric_type`), as float64 otherwise; empty
+    values are written as nulls. The types depend on the column names only, so all slices of a table share one schema.
+    """
+
+    def __init__(self, path: str, columns: List[str], metric_columns: int, batch_rows: int = DEFAULT_BATCH_ROWS):
+        self._path = path
+        self._columns = columns
+        self._first_metric = len(columns) - metric_columns
+        self._batch_rows = batch_rows
+        self._batch: List[list] = [[] for _ in columns]
+        self._schema = pa.schema([
+            pa.field(column, DIMENSION_TYPE if index < self._first_metric else metric_type(column))
+            for index, column in enumerate(columns)])
+        self._writer: pq.ParquetWriter = None
+
+    def __enter__(self) -> 'ParquetSliceWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        elif self._writer:
+            self._writer.close()
+
+    def writerow(self, row: list):
+        if len(row) != len(self._columns):
+            raise ValueError(f'Row has {len(row)} values, expected {len(self._columns)} columns {self._columns}')
+        for values, value in zip(self._batch, row):
+            values.append(value)
+        if len(self._batch[0]) >= self._batch_rows:
+            self._write_batch()
+
+    def close(self):
+        if self._batch[0] or not self._writer:
+            # an empty file still gets its schema
+            self._write_batch()
+        self._writer.close()
+
+    def _write_batch(self):
+        arrays = [pa.array(values, pa.string()) for values in self._batch]
+        self._batch = [[] for _ in self._columns]
+        for index in range(self._first_metric, len(arrays)):
+            arrays[index] = pc.if_else(pc.equal(arrays[index], ''), pa.scalar(None, pa.string()), arrays[index])
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self._path, self._schema)
+
+        typed = []
+        for index, array in enumerate(arrays):
+            if index < self._first_metric:
+                typed.append(array.dictionary_encode())
+                continue
+            try:
+                typed.append(array.cast(self._schema.field(index).type))
+            except pa.ArrowInvalid as ex:
+                raise ValueError(f'Metric column {self._columns[index]} has a value that is not a valid '
+                                 f'{self._schema.field(index).type}: {ex}') from ex
+        self._writer.write_table(pa.Table.from_arrays(typed, schema=self._schema))
+
+
+def metric_type(name: str) -> pa.DataType:
+    """Type of a metric column by its CM360 name, e.g. int64 for `impressions`, float64 for `clickRate`."""
+    is_count = _COUNT_METRIC.search(name[:1].upper() + name[1:]) and not _RATIO_METRIC.search(name)
+    return pa.int64() if is_count else pa.float64()
@@ -0,0 +1,65 @@
+import math
+from typing import Dict, Iterable, List, Optional
+
+# weight of the latest run in the moving averages
+SMOOTHING = 0.5
+
+
+class ProfileHistory:
+    """
+    Moving averages of the queue time, file size and download time of past reports of each profile, kept in state.
+
+    Used to start and download the reports expected to take longest first (longest processing time first), so the
+    total run time approaches the duration of the longest report instead of depending on the order of profiles.
+    Profiles without history are expected to be the longest, they may be large and nothing is lost by starting them
+    early.
+    """
+
+    def __init__(self, history: Dict[str, dict] = None):
+        self._history: Dict[str, dict] = {profile_id: dict(item) for profile_id, item in (history or {}).items()}
+
+    def to_dict(self) -> Dict[str, dict]:
+        return self._history
+
+    def retain(self, profile_ids: Iterable[str]):
+        """Drops the history of profiles that are not in `profile_ids`, e.g. removed from the configuration."""
+        profile_ids = set(profile_ids)
+        self._history = {profile_id: item for profile_id, item in self._history.items() if profile_id in profile_ids}
+
+    def update(self, profile_id: str, queue_s: float, download_s: float, size_bytes: int):
+        previous = self._history.get(profile_id)
+        current = dict(queue_s=queue_s, download_s=download_s, bytes=size_bytes)
+        if previous:
+            current = {name: SMOOTHING * value + (1 - SMOOTHING) * previous.get(name, value)
+                       for name, value in current.items()}
+        self._history[profile_id] = dict({name: round(value, 3) for name, value in current.items()},
+                                         runs=(previous or {}).get('runs', 0) + 1)
+
+    def expected_duration(self, profile_id: str) -> Optional[float]:
+        """Expected seconds from the start of the report until its file is downloaded, None if unknown."""
+        item = self._history.get(profile_id)
+        return item['queue_s'] + item['download_s'] if item else None
+
+    def expected_download(self, profile_id: str) -> Optional[float]:
+        item = self._history.get(profile_id)
+        return item['download_s'] if item else None
+
+    def longest_first(self, items: List[dict], expected=None) -> List[dict]:
+        """Orders items (with a `profile_id`) from the longest expected duration, profiles without history first."""
+        expected = expected or self.expected_duration
+
+        def _key(item: dict) -> float:
+            duration = expected(item['profile_id'])
+            return -math.inf if duration is None else -duration
+
+        return sorted(items, key=_key)
+
+    def download_workers(self, profile_ids: List[str], max_workers: int) -> int:
+        """
+        Number of download workers needed so that the downloads of all profiles take about as long as the longest
+        one. All profiles must have history, otherwise `max_workers` is used.
+        """
+        downloads = [self.expected_download(profile_id) for profile_id in set(profile_ids)]
+        if not downloads or any(download is None for download in downloads) or max(downloads) <= 0:
+            return max_workers
+        return max(1, min(max_workers, math.ceil(sum(downloads) / max(downloads))))
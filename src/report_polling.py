@@ -0,0 +1,99 @@
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, List, Optional
+
+# Available statuses: PROCESSING|REPORT_AVAILABLE|FAILED|CANCELLED|QUEUED
+STATUS_QUEUED = 'QUEUED'
+STATUS_PROCESSING = 'PROCESSING'
+
+# Queued reports usually wait for minutes, processing ones finish sooner - back off slower while processing.
+BACKOFF_FACTORS = {
+    STATUS_QUEUED: 2.0,
+    STATUS_PROCESSING: 1.5
+}
+DEFAULT_BACKOFF_FACTOR = 1.5
+
+
+@dataclass
+class _PollEntry:
+    item: dict
+    next_check: float
+    delay: float
+    status: str = STATUS_QUEUED
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+class ReportPollScheduler:
+    """
+    Decides when each pending report file should be checked next.
+
+    Every file is tracked separately: the first check happens after `initial_delay` seconds, following checks are
+    spaced with an exponential backoff (depending on the last reported status) capped at `max_delay` and randomized
+    by +-`jitter` so that checks of reports started together spread out over time. Files due within
+    `batch_window` seconds are returned together, so their statuses can be checked in a single batch request.
+    """
+
+    def __init__(self, initial_delay: float = 2.0, max_delay: float = 60.0, jitter: float = 0.2,
+                 batch_window: float = 1.0, clock: Callable[[], float] = time.monotonic,
+                 rng: Optional[random.Random] = None):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.batch_window = batch_window
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._entries: Dict[Hashable, _PollEntry] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, key: Hashable, item: dict, started_at: float = None, first_check_delay: float = None):
+        now = self._clock()
+        first_delay = self.initial_delay if first_check_delay is None else first_check_delay
+        entry = _PollEntry(item=item, next_check=now + self._jittered(first_delay), delay=self.initial_delay)
+        entry.timings['started'] = started_at if started_at is not None else now
+        self._entries[key] = entry
+
+    def seconds_to_next_check(self) -> float:
+        if not self._entries:
+            return 0
+        next_check = min(entry.next_check for entry in self._entries.values())
+        return max(0.0, next_check - self._clock())
+
+    def seconds_to_check(self, key: Hashable) -> float:
+        """Returns seconds until the next check of a single file, used when each file is polled on its own."""
+        return max(0.0, self._entries[key].next_check - self._clock())
+
+    def pop_due(self) -> List[Hashable]:
+        """Returns keys of all files that should be checked now or within the batch window."""
+        due = self._clock() + self.batch_window
+        return [key for key, entry in self._entries.items() if entry.next_check <= due]
+
+    def reschedule(self, key: Hashable, status: str):
+        """Schedules the next check of a still running file based on its last reported status."""
+        entry = self._entries[key]
+        now = self._clock()
+        if status != entry.status:
+            entry.timings.setdefault(status.lower(), now)
+            entry.status = status
+        factor = BACKOFF_FACTORS.get(status, DEFAULT_BACKOFF_FACTOR)
+        entry.delay = min(self.max_delay, entry.delay * factor)
+        entry.next_check = now + self._jittered(entry.delay)
+
+    def finish(self, key: Hashable, status: str) -> Dict[str, float]:
+        """Stops tracking a finished file.
+
+        Returns: Seconds elapsed since the report was started until each observed status change.
+
+        """
+        entry = self._entries.pop(key)
+        entry.timings.setdefault(status.lower(), self._clock())
+        started = entry.timings['started']
+        return {name: timestamp - started for name, timestamp in entry.timings.items() if name != 'started'}
+
+    def item(self, key: Hashable) -> dict:
+        return self._entries[key].item
+
+    def _jittered(self, delay: float) -> float:
+        return delay * self._rng.uniform(1 - self.jitter, 1 + self.jitter)
@@ -0,0 +1,232 @@
+import csv
+import io
+from typing import IO, Callable, Iterable, Iterator, Tuple
+
+REPORT_FIELDS_MARKER = 'Report Fields'
+GRAND_TOTAL_MARKER = 'Grand Total:'
+READ_BUFFER_SIZE = 1024 * 1024
+
+
+class ReportFormatError(ValueError):
+    pass
+
+
+class ChunkStream(io.RawIOBase):
+    """Adapts an iterator of bytes chunks (e.g. a streamed download) to a readable binary stream."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._pending = memoryview(b'')
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            try:
+                self._pending = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def profile_prefix(profile_id: str, profile_name: str) -> str:
+    """Returns the CSV encoded `profileId,profileName,` prefix prepended to each data row."""
+    prefix = io.StringIO()
+    csv.writer(prefix, delimiter=',', lineterminator='').writerow([profile_id, profile_name])
+    return prefix.getvalue() + ','
+
+
+def transform_report_stream(chunks: Iterable[bytes], target: IO[str], profile_id: str, profile_name: str,
+                            on_header: Callable[[list], None] = None, stats: dict = None) -> list:
+    """
+    Converts a CM360 CSV report stream into the final table slice in a single pass.
+
+    The report preamble is skipped up to the `Report Fields` line, `profileId` and `profileName` columns are
+    prepended to each data row and the stream is read up to the `Grand Total:` footer.
+
+    Args:
+        chunks: Iterator of the report file content chunks
+        target: Text file the table slice (without header) is written into
+        profile_id: Profile ID value of each row
+        profile_name: Profile name value of each row
+        on_header: Called with the report header before any row is written, may raise to stop the transform
+        stats: If set, the number of written `rows` is stored in it
+
+    Returns: Header of the table slice
+
+    """
+    csv_tgt = csv.writer(target, delimiter=',', lineterminator='\n')
+    header, rows = _report_rows(chunks, on_header)
+    prefix = profile_prefix(profile_id, profile_name)
+    written = 0
+    for row in rows:
+        target.write(prefix)
+        csv_tgt.writerow(row)
+        written += 1
+
+    if stats is not None:
+        stats['rows'] = written
+    return ['profileId', 'profileName'] + header
+
+
+def transform_report_rows(chunks: Iterable[bytes], writer, profile_id: str, profile_name: str,
+                          on_header: Callable[[list], None] = None, stats: dict = None) -> list:
+    """
+    Variant of `transform_report_stream` passing the parsed rows, prefixed with `profileId` and `profileName`,
+    to a row writer (an object with a `writerow(row)` method, e.g. `ParquetSliceWriter`) instead of a text file.
+
+    Returns: Header of the table slice
+
+    """
+    header, rows = _report_rows(chunks, on_header)
+    written = 0
+    for row in rows:
+        writer.writerow([profile_id, profile_name] + row)
+        written += 1
+
+    if stats is not None:
+        stats['rows'] = written
+    return ['profileId', 'profileName'] + header
+
+
+def _report_rows(chunks: Iterable[bytes], on_header: Callable[[list], None] = None) -> Tuple[list, Iterator[list]]:
+    """Parses the report header and returns it with an iterator of the data rows, up to the `Grand Total:` footer."""
+    src = io.TextIOWrapper(io.BufferedReader(ChunkStream(chunks), buffer_size=READ_BUFFER_SIZE),
+                           encoding='utf-8', newline='')
+    csv_src = csv.reader(src, delimiter=',')
+    for row in csv_src:
+        if row == [REPORT_FIELDS_MARKER]:
+            break
+    header = next(csv_src, None)
+    if header is None:
+        raise ReportFormatError(f'The report does not contain the "{REPORT_FIELDS_MARKER}" section')
+    if on_header:
+        on_header(header)
+
+    def _rows() -> Iterator[list]:
+        for row in csv_src:
+            if not row:
+                continue
+            if row[0] == GRAND_TOTAL_MARKER:
+                break
+            yield row
+
+    return header, _rows()
+
+
+def transform_report_stream_fast(chunks: Iterable[bytes], target: IO[bytes], profile_id: str,
+                                 profile_name: str, block_size: int = READ_BUFFER_SIZE,
+                                 on_header: Callable[[list], None] = None, stats: dict = None) -> list:
+    """
+    Byte level variant of `transform_report_stream` producing the same table slice without parsing data rows.
+
+    Rows are processed in large blocks of raw bytes: the encoded `profileId,profileName,` prefix is inserted after
+    each record separator and the footer is detected by the `Grand Total:` prefix of a record. Blocks containing
+    quoted line breaks or empty lines are processed line by line, tracking whether a line break is inside a quoted
+    value.
+
+    Args:
+        chunks: Iterator of the report file content chunks
+        target: Binary file the table slice (without header) is written into
+        profile_id: Profile ID value of each row
+        profile_name: Profile name value of each row
+        block_size: Size of the blocks processed at once
+        on_header: Called with the report header before any row is written, may raise to stop the transform
+        stats: If set, the number of written `rows` is stored in it
+
+    Returns: Header of the table slice
+
+    """
+    src = io.BufferedReader(ChunkStream(chunks), buffer_size=block_size)
+    for line in src:
+        if line.rstrip(b'\r\n') == REPORT_FIELDS_MARKER.encode():
+            break
+    header_line = _read_record(src)
+    if not header_line:
+        raise ReportFormatError(f'The report does not contain the "{REPORT_FIELDS_MARKER}" section')
+    header = next(csv.reader([header_line.decode('utf-8')], delimiter=','))
+    if on_header:
+        on_header(header)
+
+    prefix = profile_prefix(profile_id, profile_name).encode('utf-8')
+    footer = GRAND_TOTAL_MARKER.encode()
+    in_quotes = False
+    pending = b''
+    finished = False
+    rows = 0
+    while not finished:
+        data = src.read(block_size)
+        if not data:
+            if not pending:
+                break
+            # the last record without a trailing line break
+            data, pending = pending + b'\n', b''
+        else:
+            data, pending = pending + data, b''
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            data, pending = data[:end], data[end:]
+        if not data:
+            continue
+
+        if not in_quotes and not data.startswith((b'\n', b'\r\n')) and b'\n\n' not in data \
+                and b'\n\r\n' not in data and not _has_quoted_line_break(data):
+            block = data.replace(b'\r\n', b'\n')
+            if block.startswith(footer):
+                break
+            footer_pos = block.find(b'\n' + footer)
+            if footer_pos != -1:
+                block = block[:footer_pos + 1]
+                finished = True
+            target.write(prefix)
+            target.write(block[:-1].replace(b'\n', b'\n' + prefix))
+            target.write(b'\n')
+            rows += block.count(b'\n')
+        else:
+            out = []
+            for line in data[:-1].split(b'\n'):
+                if in_quotes:
+                    out.append(line)
+                else:
+                    if line.startswith(footer):
+                        finished = True
+                        break
+                    if line in (b'', b'\r'):
+                        continue
+                    out.append(prefix)
+                    out.append(line)
+                    rows += 1
+                if line.count(b'"') % 2:
+                    in_quotes = not in_quotes
+                if in_quotes:
+                    out.append(b'\n')
+                else:
+                    if out[-1].endswith(b'\r'):
+                        out[-1] = out[-1][:-1]
+                    out.append(b'\n')
+            target.write(b''.join(out))
+
+    if stats is not None:
+        stats['rows'] = rows
+    return ['profileId', 'profileName'] + header
+
+
+def _has_quoted_line_break(data: bytes) -> bool:
+    """Returns True if any line of the block has an odd number of quotes, i.e. starts or ends a multi-line value."""
+    if b'"' not in data:
+        return False
+    return any(line.count(b'"') % 2 for line in data.split(b'\n'))
+
+
+def _read_record(src: io.BufferedReader) -> bytes:
+    """Reads a single CSV record from the stream, including line breaks in quoted values."""
+    record = b''
+    for line in src:
+        record += line
+        if record.count(b'"') % 2 == 0:
+            break
+    return record
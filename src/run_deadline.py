@@ -0,0 +1,36 @@
+import math
+import time
+from typing import Callable
+
+# share of the budget kept for writing state, manifests and run metrics after the reports are abandoned
+FINALIZE_RESERVE_RATIO = 0.1
+FINALIZE_RESERVE_MAX_S = 120.0
+
+
+class RunDeadline:
+    """
+    Time budget of the whole run, starting when the object is created.
+
+    Waiting for the reports may take the budget up to a reserve left for finishing the run, so that state and
+    manifests are still written before the platform kills the job. A budget of 0 disables the deadline.
+    """
+
+    def __init__(self, budget_s: float, clock: Callable[[], float] = time.monotonic):
+        self.budget_s = budget_s if budget_s and budget_s > 0 else 0
+        self._clock = clock
+        self._started = clock()
+        self._reserve_s = min(self.budget_s * FINALIZE_RESERVE_RATIO, FINALIZE_RESERVE_MAX_S)
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget_s > 0
+
+    def wait_time_left(self) -> float:
+        """Seconds left for running and downloading the reports, infinite if the deadline is disabled."""
+        if not self.enabled:
+            return math.inf
+        return max(0.0, self._started + self.budget_s - self._reserve_s - self._clock())
+
+    @property
+    def exceeded(self) -> bool:
+        return self.wait_time_left() <= 0
@@ -0,0 +1,77 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+METRICS_FILE_NAME = 'run_metrics.json'
+
+
+class RunMetrics:
+    """
+    Collects durations of the run phases and per-profile throughput counters. Safe to use from worker threads.
+
+    Phases are measured as wall time of the main thread (e.g. the whole wait for all reports), per-profile durations
+    (report run, queue wait, download) are measured in the workers handling the profile and summed up.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._started = clock()
+        self._lock = threading.Lock()
+        self._phases: Dict[str, float] = defaultdict(float)
+        self._profiles: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(int))
+
+    @contextmanager
+    def phase(self, name: str, profile_id: str = None):
+        """Measures the duration of the block as a run phase, or as a phase of the profile if profile_id is set."""
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self.add_duration(name, self._clock() - start, profile_id=profile_id)
+
+    def add_duration(self, name: str, seconds: float, profile_id: str = None):
+        with self._lock:
+            if profile_id is None:
+                self._phases[name] += seconds
+            else:
+                self._profiles[profile_id][f'{name}_s'] += seconds
+
+    def count(self, profile_id: str, **counters: float):
+        with self._lock:
+            for name, value in counters.items():
+                self._profiles[profile_id][name] += value
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            profiles = {}
+            for profile_id, counters in self._profiles.items():
+                profile = {name: round(value, 3) if isinstance(value, float) else value
+                           for name, value in counters.items()}
+                if counters.get('download_s'):
+                    profile['rows_per_s'] = round(counters.get('rows', 0) / counters['download_s'], 1)
+                    profile['bytes_per_s'] = round(counters.get('bytes', 0) / counters['download_s'], 1)
+                profiles[profile_id] = profile
+            return dict(total_s=round(self._clock() - self._started, 3),
+                        phases={name: round(value, 3) for name, value in self._phases.items()},
+                        profiles=profiles)
+
+    def summary(self) -> str:
+        metrics = self.to_dict()
+        phases = ', '.join(f'{name} {seconds:.1f} s' for name, seconds in metrics['phases'].items())
+        profiles = metrics['profiles']
+        rows = sum(profile.get('rows', 0) for profile in profiles.values())
+        size_mb = sum(profile.get('bytes', 0) for profile in profiles.values()) / 1024 / 1024
+        summary = f'Run finished in {metrics["total_s"]:.1f} s ({phases}), {int(rows)} rows, {size_mb:.1f} MB'
+        if profiles:
+            slowest = max(profiles, key=lambda profile_id: profiles[profile_id].get('queue_wait_s', 0)
+                          + profiles[profile_id].get('download_s', 0))
+            summary += f', slowest profile {slowest}'
+        return summary
+
+    def write(self, path: str, **extra):
+        """Writes the metrics and any extra items (e.g. API call counters) into a JSON file."""
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(dict(self.to_dict(), **extra), file, indent=2)
@@ -0,0 +1,67 @@
+import gzip
+import io
+import queue
+import threading
+from typing import BinaryIO
+
+# blocks passed to the compression thread, larger blocks mean fewer hand-overs between threads
+BLOCK_SIZE = 1024 * 1024
+# maximum number of blocks waiting for compression
+QUEUE_SIZE = 16
+COMPRESS_LEVEL = 6
+_END = object()
+
+
+class BackgroundGzipWriter(io.RawIOBase):
+    """
+    Writable binary stream compressing the written data into a gzip file on a background thread.
+
+    zlib releases the GIL while compressing, so the thread writing the data (e.g. a report transform) keeps running
+    while the previous blocks are being compressed.
+    """
+
+    def __init__(self, path: str, compresslevel: int = COMPRESS_LEVEL, queue_size: int = QUEUE_SIZE):
+        super().__init__()
+        self._gzip_file = gzip.open(path, 'wb', compresslevel=compresslevel)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._compress, name=f'gzip-{path}', daemon=True)
+        self._thread.start()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self._error:
+            raise self._error
+        # the caller may reuse its buffer once write returns
+        self._queue.put(bytes(data))
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self._queue.put(_END)
+        self._thread.join()
+        super().close()
+        if self._error:
+            raise self._error
+
+    def _compress(self):
+        try:
+            while (block := self._queue.get()) is not _END:
+                self._gzip_file.write(block)
+        except Exception as ex:
+            self._error = ex
+            # keep consuming so that the writer is not blocked on a full queue
+            while self._queue.get() is not _END:
+                pass
+        finally:
+            self._gzip_file.close()
+
+
+def open_slice(path: str, compress: bool = False) -> BinaryIO:
+    """Opens a table slice for binary writing, gzip compressed on a background thread if `compress` is set."""
+    if not compress:
+        return open(path, 'wb')
+    return io.BufferedWriter(BackgroundGzipWriter(path), buffer_size=BLOCK_SIZE)
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import sys
+import unittest
+
+from google_cm360 import AsyncGoogleCM360Client
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'scripts'))
+
+from fake_cm360_server import FakeCM360Server, FakeServerSettings  # noqa: E402
+
+REPORT = {'name': 'test', 'type': 'STANDARD', 'format': 'CSV',
+          'criteria': {'dateRange': {'relativeDateRange': 'LAST_7_DAYS'}, 'dimensions': [{'name': 'date'}],
+                       'metricNames': ['impressions', 'clicks']}}
+
+
+class TestAsyncClientWithFakeServer(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeCM360Server(FakeServerSettings(profiles=2, rows=500, queue_s=0.1, processing_s=0.1,
+                                                         metadata_items=30, page_size=10)).start()
+        self.client = AsyncGoogleCM360Client('client', 'secret', {'access_token': 'token', 'refresh_token': 'refresh'},
+                                             ['scope'], root_url=self.server.root_url,
+                                             token_uri=self.server.token_uri)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_concurrent_reports_are_run_polled_and_downloaded(self):
+        async def _run_report(client: AsyncGoogleCM360Client, profile_id: str) -> str:
+            report = await client.create_report(REPORT, profile_id=profile_id)
+            report_file = await client.run_report(profile_id=profile_id, report_id=report['id'])
+            while (await client.report_status(report['id'], report_file['id']))['status'] != 'REPORT_AVAILABLE':
+                await asyncio.sleep(0.05)
+            chunks = [chunk async for chunk in client.iter_report_file(report['id'], report_file['id'],
+                                                                        chunk_size=1024)]
+            return b''.join(chunks).decode()
+
+        async def _run() -> list:
+            async with self.client as client:
+                self.assertEqual(set(await client.list_profiles()), {'1000', '1001'})
+                return await asyncio.gather(_run_report(client, '1000'), _run_report(client, '1001'))
+
+        for content in asyncio.run(_run()):
+            self.assertIn('Report Fields\r\ndate,impressions,clicks\r\n', content)
+            self.assertEqual(content.count('\r\n2024-01-'), 500)
+        self.assertEqual(self.client.profile_api_calls['1000'], 2)
+
+    def test_dropped_download_is_resumed(self):
+        async def _download(client: AsyncGoogleCM360Client, report_id: str, file_id: str) -> bytes:
+            return b''.join([chunk async for chunk in client.iter_report_file(report_id, file_id)])
+
+        async def _run() -> tuple:
+            async with self.client as client:
+                report = await client.create_report(REPORT, profile_id='1000')
+                report_file = await client.run_report(profile_id='1000', report_id=report['id'])
+                await asyncio.sleep(0.3)
+                content = await _download(client, report['id'], report_file['id'])
+                self.server.state.settings.disconnect_after_bytes = len(content) // 3 + 1
+                return content, await _download(client, report['id'], report_file['id'])
+
+        content, resumed = asyncio.run(_run())
+        self.assertEqual(resumed, content)
+        self.assertEqual(self.client.api_stats['retried'], 2)
+
+    def test_metadata_pages(self):
+        async def _run() -> list:
+            async with self.client as client:
+                return [item async for item in client.list_metadata(profile_id='1001', endpoint_name='campaigns')]
+
+        self.assertEqual(len(asyncio.run(_run())), 30)
+
+
+if __name__ == "__main__":
+    unittest.main()
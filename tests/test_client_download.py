@@ -0,0 +1,60 @@
+import unittest
+
+import mock
+
+from google_cm360 import GoogleCM360Client
+
+CONTENT = bytes(range(256)) * 40
+
+
+class FakeResponse:
+
+    def __init__(self, status_code: int, body: bytes, headers: dict):
+        self.status_code = status_code
+        self.headers = headers
+        self._body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size: int):
+        for start in range(0, len(self._body), chunk_size):
+            yield self._body[start:start + chunk_size]
+
+
+class TestReportFileDownload(unittest.TestCase):
+
+    def setUp(self):
+        self.client = GoogleCM360Client('client', 'secret', {'access_token': 'token', 'refresh_token': 'refresh'},
+                                        ['scope'])
+        self.client._executor.backoff_delay = lambda attempt: 0
+        self.session = mock.Mock()
+        self.client._get_session = lambda: self.session
+
+    def test_dropped_connection_is_resumed(self):
+        # the connection is closed after 3000 of the announced bytes, the rest is requested with a Range header
+        self.session.get.side_effect = [
+            FakeResponse(200, CONTENT[:3000], {'Content-Length': str(len(CONTENT))}),
+            FakeResponse(206, CONTENT[3000:7000], {'Content-Range': f'bytes 3000-{len(CONTENT) - 1}/{len(CONTENT)}'}),
+            FakeResponse(206, CONTENT[7000:], {'Content-Range': f'bytes 7000-{len(CONTENT) - 1}/{len(CONTENT)}'})]
+
+        content = b''.join(self.client.iter_report_file('1', '2', chunk_size=1000))
+
+        self.assertEqual(content, CONTENT)
+        self.assertEqual([call.kwargs['headers'] for call in self.session.get.call_args_list],
+                         [{}, {'Range': 'bytes=3000-'}, {'Range': 'bytes=7000-'}])
+
+    def test_complete_response_is_not_resumed(self):
+        self.session.get.side_effect = [FakeResponse(200, CONTENT, {'Content-Length': str(len(CONTENT))})]
+        self.assertEqual(b''.join(self.client.iter_report_file('1', '2')), CONTENT)
+        self.assertEqual(self.session.get.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,12 +3,37 @@ Created on 12. 11. 2018
 
 @author: esner
 '''
+import json
+import shutil
+import tempfile
+import threading
 import unittest
 import mock
 import os
 from freezegun import freeze_time
+from keboola.component.exceptions import UserException
 
-from component import Component
+from component import Component, _load_attribute_labels_from_json, _load_labels_index
+from configuration import Configuration, InputVariant, Performance, TimeRange
+from profile_history import ProfileHistory
+from run_deadline import RunDeadline
+
+
+class ComponentTestCase(unittest.TestCase):
+    """Creates components by the real `__init__`, with a temporary data dir removed after the test."""
+
+    def _component(self, cfg: Configuration) -> Component:
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir, ignore_errors=True)
+        os.makedirs(os.path.join(data_dir, 'out', 'tables'))
+        os.makedirs(os.path.join(data_dir, 'out', 'files'))
+        with open(os.path.join(data_dir, 'config.json'), 'w') as config:
+            json.dump({'parameters': {}}, config)
+        with mock.patch.dict(os.environ, {'KBC_DATADIR': data_dir}):
+            comp = Component()
+        comp.cfg = cfg
+        comp.google_client = mock.Mock()
+        return comp
 
 
 class TestComponent(unittest.TestCase):
@@ -23,6 +48,191 @@ class TestComponent(unittest.TestCase):
             comp.run()
 
 
+class TestAttributeLabels(unittest.TestCase):
+
+    def test_labels_file_is_loaded_once(self):
+        _load_labels_index.cache_clear()
+        with mock.patch('component.json.load', wraps=json.load) as json_load:
+            self.assertEqual(_load_attribute_labels_from_json('STANDARD', 'dimensions')['activityId'], 'Activity ID')
+            self.assertIn('clicks', _load_attribute_labels_from_json('STANDARD', 'metrics'))
+            self.assertEqual(_load_attribute_labels_from_json('UNKNOWN', 'dimensions'), {})
+        self.assertEqual(json_load.call_count, 1)
+
+
+class TestDateRangeChunks(ComponentTestCase):
+
+    def _chunked_component(self, chunk_days: int) -> Component:
+        return self._component(Configuration(profiles=['1'], input_variant=InputVariant.REPORT_SPEC,
+                                             time_range=TimeRange(period='CUSTOM_DATES', chunk_days=chunk_days)))
+
+    def test_split_date_range(self):
+        date_range = {'relativeDateRange': None, 'startDate': '2024-01-01', 'endDate': '2024-01-10'}
+        chunks = self._chunked_component(4)._split_date_range(date_range)
+        self.assertEqual([(chunk['startDate'], chunk['endDate']) for chunk in chunks],
+                         [('2024-01-01', '2024-01-04'), ('2024-01-05', '2024-01-08'), ('2024-01-09', '2024-01-10')])
+
+    def test_no_split(self):
+        date_range = {'relativeDateRange': 'LAST_7_DAYS', 'startDate': None, 'endDate': None}
+        self.assertEqual(self._chunked_component(4)._split_date_range(date_range), [date_range])
+        custom_range = {'relativeDateRange': None, 'startDate': '2024-01-01', 'endDate': '2024-01-10'}
+        self.assertEqual(self._chunked_component(0)._split_date_range(custom_range), [custom_range])
+
+
+class TestWatermarks(ComponentTestCase):
+
+    def _watermarked_component(self, watermarks: dict) -> Component:
+        comp = self._component(Configuration(
+            profiles=['1', '2'], input_variant=InputVariant.REPORT_SPEC,
+            time_range=TimeRange(period='LAST_30_DAYS', use_watermark=True, restatement_days=3)))
+        comp.watermarks = watermarks
+        return comp
+
+    @freeze_time("2024-05-15")
+    def test_only_new_days_are_extracted(self):
+        comp = self._watermarked_component({'1': '2024-05-13'})
+        period = {'relativeDateRange': 'LAST_30_DAYS', 'startDate': None, 'endDate': None}
+        self.assertEqual(comp._get_profile_date_range('1', period),
+                         {'relativeDateRange': None, 'startDate': '2024-05-11', 'endDate': '2024-05-14'})
+        self.assertEqual(comp._get_profile_date_range('2', period),
+                         {'relativeDateRange': None, 'startDate': '2024-04-15', 'endDate': '2024-05-14'})
+
+    @freeze_time("2024-05-15")
+    def test_watermark_advanced_only_for_downloaded_profiles(self):
+        comp = self._watermarked_component({'1': '2024-05-13'})
+        period = {'relativeDateRange': 'MONTH_TO_DATE', 'startDate': None, 'endDate': None}
+        comp._get_profile_date_range('1', period)
+        comp._get_profile_date_range('2', period)
+        comp._advance_watermarks([{'profile_id': '1', 'header': ['a']}, {'profile_id': '2', 'header': None}])
+        self.assertEqual(comp.watermarks, {'1': '2024-05-14'})
+
+    @freeze_time("2024-05-15")
+    def test_watermark_not_advanced_for_profiles_without_report_files(self):
+        comp = self._watermarked_component({'1': '2024-05-13'})
+        period = {'relativeDateRange': 'MONTH_TO_DATE', 'startDate': None, 'endDate': None}
+        comp._get_profile_date_range('1', period)
+        comp._get_profile_date_range('2', period)
+        comp._advance_watermarks([{'profile_id': '1', 'header': ['a']}])
+        self.assertEqual(comp.watermarks, {'1': '2024-05-14'})
+
+    def test_state_of_removed_profiles_is_dropped(self):
+        comp = self._watermarked_component({'1': '2024-05-13', '3': '2024-05-13'})
+        comp.history = ProfileHistory({'1': dict(queue_s=0, download_s=1, bytes=1, runs=1),
+                                       '3': dict(queue_s=0, download_s=1, bytes=1, runs=1)})
+        comp._prune_profile_state({'1', '2'})
+        self.assertEqual(comp.watermarks, {'1': '2024-05-13'})
+        self.assertEqual(list(comp.history.to_dict()), ['1'])
+
+
+class TestHeaderValidation(ComponentTestCase):
+
+    def setUp(self):
+        self.comp = self._component(Configuration(
+            profiles=['1', '2'], input_variant=InputVariant.REPORT_SPEC,
+            destination=mock.Mock(table_name='report', compress_slices=False),
+            performance=Performance(poll_initial_delay_s=0.01, poll_max_delay_s=0.01)))
+        self.comp.common_dimensions = ['date']
+        self.comp.common_metrics = ['impressions']
+
+    def test_header_is_validated(self):
+        report_file = {'profile_id': '1', 'report_id': '10'}
+        self.comp._validate_report_header(report_file, ['Date', 'Impressions'])
+        with self.assertRaises(UserException):
+            self.comp._validate_report_header(report_file, ['Date', 'Clicks'])
+        with self.assertRaises(UserException):
+            self.comp._validate_report_header(report_file, ['Date'])
+
+    def test_mismatch_aborts_running_reports(self):
+        report_files = [dict(profile_id='1', report_id='10', file_id='f1', profile_name='one'),
+                        dict(profile_id='2', report_id='20', file_id='f2', profile_name='two')]
+        self.comp.google_client.report_statuses.side_effect = lambda files: {
+            file_id: {'status': 'REPORT_AVAILABLE' if file_id == 'f1' else 'QUEUED', 'format': 'CSV',
+                      'reportId': report_id} for report_id, file_id in files}
+        self.comp.google_client.iter_report_file.side_effect = \
+            lambda **_: (chunk for chunk in [b'Report Fields\nDate\n2024-01-01\n'])
+
+        with self.assertRaisesRegex(UserException, 'has 1 columns'):
+            self.comp._wait_download_report_files(report_files)
+        self.assertTrue(self.comp._abort.is_set())
+
+    def test_failed_report_file_fails_the_run(self):
+        report_files = [dict(profile_id='1', report_id='10', file_id='f1', header=['profileId', 'profileName', 'Date']),
+                        dict(profile_id='2', report_id='20', file_id='f2', status='FAILED')]
+        with self.assertRaisesRegex(UserException, 'report 20 file f2 of profile 2: FAILED'):
+            self.comp._process_report_files(report_files)
+
+    def test_wait_stops_at_deadline(self):
+        self.comp.deadline = RunDeadline(0.3)
+        report_files = [dict(profile_id='1', report_id='10', file_id='f1', profile_name='one')]
+        self.comp.google_client.report_statuses.side_effect = lambda files: {
+            file_id: {'status': 'QUEUED', 'reportId': report_id} for report_id, file_id in files}
+
+        self.comp._wait_download_report_files(report_files)
+        self.assertTrue(self.comp._deadline_exceeded)
+        summary = self.comp._deadline_summary([dict(profile_id='1', report_id='10'),
+                                               dict(profile_id='2', report_id='20')], report_files)
+        self.assertIn('profile 1 (report 10 file f1: QUEUED)', summary)
+        self.assertIn('profile 2 (report 20: not started)', summary)
+
+
+class TestReusableFile(ComponentTestCase):
+
+    REPORT = {'id': '10', 'type': 'STANDARD', 'lastModifiedTime': '1000',
+              'criteria': {'dateRange': {'relativeDateRange': 'LAST_7_DAYS'}}}
+
+    @freeze_time("2024-05-15 12:00:00")
+    def test_recent_file_for_resolved_date_range_is_looked_up(self):
+        comp = self._component(Configuration(profiles=['1'], input_variant=InputVariant.REPORT_IDS,
+                                             performance=Performance(reuse_file_max_age_min=60)))
+
+        comp._find_reusable_file('1', '10', self.REPORT)
+        comp.google_client.find_available_file.assert_called_once_with(
+            '1', '10', start_date='2024-05-08', end_date='2024-05-14', modified_after_ms=1715770800000)
+        # the report resource fetched while preparing the reports is used, it is not fetched again
+        comp.google_client.get_report.assert_not_called()
+
+    def test_new_report_is_not_looked_up(self):
+        comp = self._component(Configuration(profiles=['1'], input_variant=InputVariant.REPORT_SPEC,
+                                             performance=Performance(reuse_file_max_age_min=60)))
+        self.assertIsNone(comp._find_reusable_file('1', '10', None))
+        comp.google_client.find_available_file.assert_not_called()
+
+    def test_reuse_disabled_by_default(self):
+        comp = self._component(Configuration(profiles=['1'], input_variant=InputVariant.REPORT_IDS))
+        self.assertIsNone(comp._find_reusable_file('1', '10', self.REPORT))
+        comp.google_client.find_available_file.assert_not_called()
+
+
+class TestStaleReportsCleanup(ComponentTestCase):
+
+    def _cleanup_component(self, pending_deletions: list) -> Component:
+        comp = self._component(Configuration(profiles=['1'], input_variant=InputVariant.REPORT_SPEC,
+                                             performance=Performance(cleanup_timeout_s=5)))
+        comp.pending_deletions = pending_deletions
+        return comp
+
+    def test_failed_deletions_are_carried_over(self):
+        comp = self._cleanup_component([['3', '30']])
+        comp.google_client.delete_reports.return_value = {('2', '20'): True, ('3', '30'): False}
+        comp._start_stale_reports_cleanup([('2', '20'), ('1', '10')], in_use={'10'})
+        comp._finish_stale_reports_cleanup()
+        comp.google_client.delete_reports.assert_called_once_with([('2', '20'), ('3', '30')], ignore_error=True)
+        self.assertEqual(comp.pending_deletions, [('3', '30')])
+
+    def test_unfinished_deletion_does_not_block_the_run(self):
+        comp = self._cleanup_component([])
+        comp.cfg.performance.cleanup_timeout_s = 0.01
+        release = threading.Event()
+        comp.google_client.delete_reports.side_effect = lambda reports, **_: release.wait(5) and {}
+        comp._start_stale_reports_cleanup([('2', '20')], in_use=set())
+        comp._finish_stale_reports_cleanup()
+        # the interpreter must not wait for the unfinished deletion at exit
+        cleanup_threads = [thread for thread in threading.enumerate() if thread.name == 'cleanup']
+        self.assertTrue(cleanup_threads)
+        self.assertTrue(all(thread.daemon for thread in cleanup_threads))
+        release.set()
+        self.assertEqual(comp.pending_deletions, [('2', '20')])
+
+
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
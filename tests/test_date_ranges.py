@@ -0,0 +1,43 @@
+import unittest
+from datetime import date
+
+from date_ranges import resolve_date_range, split_date_range
+
+
+def _relative(period: str) -> dict:
+    return {'relativeDateRange': period, 'startDate': None, 'endDate': None}
+
+
+class TestResolveDateRange(unittest.TestCase):
+    # Wednesday
+    today = date(2024, 5, 15)
+
+    def test_last_n_days_end_yesterday(self):
+        self.assertEqual(resolve_date_range(_relative('LAST_7_DAYS'), self.today),
+                         (date(2024, 5, 8), date(2024, 5, 14)))
+
+    def test_periods_to_date(self):
+        self.assertEqual(resolve_date_range(_relative('WEEK_TO_DATE'), self.today),
+                         (date(2024, 5, 12), self.today))
+        self.assertEqual(resolve_date_range(_relative('QUARTER_TO_DATE'), self.today),
+                         (date(2024, 4, 1), self.today))
+
+    def test_previous_periods(self):
+        self.assertEqual(resolve_date_range(_relative('PREVIOUS_WEEK'), self.today),
+                         (date(2024, 5, 5), date(2024, 5, 11)))
+        self.assertEqual(resolve_date_range(_relative('PREVIOUS_QUARTER'), self.today),
+                         (date(2024, 1, 1), date(2024, 3, 31)))
+
+    def test_custom_and_unsupported(self):
+        custom = {'relativeDateRange': None, 'startDate': '2024-01-01', 'endDate': '2024-01-31'}
+        self.assertEqual(resolve_date_range(custom, self.today), (date(2024, 1, 1), date(2024, 1, 31)))
+        self.assertIsNone(resolve_date_range(_relative('LAST_24_MONTHS'), self.today))
+
+    def test_split_date_range(self):
+        chunks = split_date_range(date(2024, 1, 1), date(2024, 1, 5), 2)
+        self.assertEqual([(chunk['startDate'], chunk['endDate']) for chunk in chunks],
+                         [('2024-01-01', '2024-01-02'), ('2024-01-03', '2024-01-04'), ('2024-01-05', '2024-01-05')])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import tempfile
+import unittest
+
+import mock
+
+from google_cm360 import discovery_cache
+
+
+class TestDiscoveryCache(unittest.TestCase):
+
+    def setUp(self):
+        discovery_cache._documents.clear()
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        discovery_cache._documents.clear()
+
+    @mock.patch('google_cm360.discovery_cache.requests.get', side_effect=AssertionError('no network expected'))
+    def test_bundled_document_is_used_offline(self, _):
+        document = discovery_cache.load_discovery_document(cache_dir=self.cache_dir)
+        self.assertEqual(document['version'], 'v4')
+        self.assertIn('reports', document['resources'])
+
+    @mock.patch('google_cm360.discovery_cache.get_static_doc', return_value=None)
+    def test_fresh_disk_cache_is_preferred(self, _):
+        with open(os.path.join(self.cache_dir, 'dfareporting.v4.json'), 'w') as file:
+            file.write('{"version": "cached"}')
+        self.assertEqual(discovery_cache.load_discovery_document(cache_dir=self.cache_dir), {'version': 'cached'})
+
+    @mock.patch('google_cm360.discovery_cache.get_static_doc', return_value=None)
+    def test_remote_document_is_cached(self, _):
+        response = mock.Mock(text='{"version": "remote"}')
+        with mock.patch('google_cm360.discovery_cache.requests.get', return_value=response):
+            discovery_cache.load_discovery_document(cache_dir=self.cache_dir)
+        with open(os.path.join(self.cache_dir, 'dfareporting.v4.json')) as file:
+            self.assertEqual(file.read(), '{"version": "remote"}')
+
+
+if __name__ == "__main__":
+    unittest.main()
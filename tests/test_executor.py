@@ -0,0 +1,86 @@
+import unittest
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from google_cm360.executor import RequestExecutor, TokenBucket, retry_after_seconds
+
+
+class FakeRequest:
+    methodId = 'dfareporting.files.get'
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def execute(self, http=None):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def _http_error(status: int, headers: dict = None, content: bytes = b'{}') -> HttpError:
+    return HttpError(httplib2.Response({'status': status, **(headers or {})}), content)
+
+
+class TestRequestExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.sleeps = []
+        self.executor = RequestExecutor(lambda: None, sleep=self.sleeps.append)
+
+    def test_retries_transient_errors(self):
+        request = FakeRequest(_http_error(503), _http_error(429, {'retry-after': '7'}), {'id': 1})
+        self.assertEqual(self.executor.execute(request), {'id': 1})
+        self.assertEqual(request.calls, 3)
+        self.assertEqual(self.sleeps[1], 7)
+        self.assertEqual(self.executor.stats, {'calls': 3, 'retried': 2, 'rate_limited': 1})
+
+    def test_does_not_retry_client_errors(self):
+        request = FakeRequest(_http_error(404), {'id': 1})
+        with self.assertRaises(HttpError):
+            self.executor.execute(request)
+        self.assertEqual(request.calls, 1)
+
+    def test_non_idempotent_retried_only_when_rate_limited(self):
+        request = FakeRequest(_http_error(403, content=b'{"error": {"errors": [{"reason": "userRateLimitExceeded"}]}}'),
+                              _http_error(500))
+        with self.assertRaises(HttpError):
+            self.executor.execute(request, idempotent=False)
+        self.assertEqual(request.calls, 2)
+
+    def test_gives_up_after_max_retries(self):
+        executor = RequestExecutor(lambda: None, max_retries=2, sleep=self.sleeps.append)
+        request = FakeRequest(*[_http_error(500)] * 3)
+        with self.assertRaises(HttpError):
+            executor.execute(request)
+        self.assertEqual(request.calls, 3)
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_waits_when_empty(self):
+        now = [0.0]
+        sleeps = []
+        bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0], sleep=sleeps.append)
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertEqual(bucket.acquire(), 0.5)
+        self.assertEqual(bucket.acquire(), 1.0)
+        now[0] = 10
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertEqual(sleeps, [0.5, 1.0])
+
+
+class TestRetryAfter(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(retry_after_seconds({'retry-after': '3'}), 3)
+        self.assertEqual(retry_after_seconds({'retry-after': 'Wed, 21 Oct 2015 07:28:00 GMT'}), 0)
+        self.assertIsNone(retry_after_seconds({}))
+
+
+if __name__ == "__main__":
+    unittest.main()
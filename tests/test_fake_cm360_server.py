@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import unittest
+
+import requests
+
+from google_cm360 import GoogleCM360Client
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'scripts'))
+
+from fake_cm360_server import FakeCM360Server, FakeServerSettings  # noqa: E402
+
+REPORT = {'name': 'test', 'type': 'STANDARD', 'format': 'CSV',
+          'criteria': {'dateRange': {'relativeDateRange': 'LAST_7_DAYS'}, 'dimensions': [{'name': 'date'}],
+                       'metricNames': ['impressions', 'clicks']}}
+
+
+class TestClientWithFakeServer(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeCM360Server(FakeServerSettings(profiles=2, rows=500, queue_s=0.1, processing_s=0.1,
+                                                         metadata_items=30, page_size=10)).start()
+        self.client = GoogleCM360Client('client', 'secret', {'access_token': 'token', 'refresh_token': 'refresh'},
+                                        ['scope'], root_url=self.server.root_url, token_uri=self.server.token_uri)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_report_is_run_polled_and_downloaded(self):
+        report = self.client.create_report(REPORT, profile_id='1000')
+        report_file = self.client.run_report(profile_id='1000', report_id=report['id'])
+        time.sleep(0.3)
+        statuses = self.client.report_statuses([(report['id'], report_file['id'])])
+        self.assertEqual(statuses[report_file['id']]['status'], 'REPORT_AVAILABLE')
+
+        content = b''.join(self.client.iter_report_file(report['id'], report_file['id'])).decode()
+        self.assertIn('Report Fields\r\ndate,impressions,clicks\r\n', content)
+        self.assertEqual(content.count('\r\n2024-01-'), 500)
+
+    def test_all_report_pages_are_listed_with_requested_fields(self):
+        created = {self.client.create_report(dict(REPORT, name=f'report {index}'), profile_id='1000')['id']
+                   for index in range(25)}
+        reports = self.client.list_reports(profile_id='1000', fields=['id', 'name', 'format'])
+        self.assertEqual({report['id'] for report in reports}, created)
+        self.assertEqual(set(reports[0]), {'id', 'name', 'format'})
+
+    def test_range_request(self):
+        report = self.client.create_report(REPORT, profile_id='1000')
+        report_file = self.client.run_report(profile_id='1000', report_id=report['id'])
+        time.sleep(0.3)
+        url = f'{self.server.root_url}dfareporting/v4/reports/{report["id"]}/files/{report_file["id"]}?alt=media'
+        content = requests.get(url).content
+        response = requests.get(url, headers={'Range': 'bytes=100-'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.headers['Content-Range'], f'bytes 100-{len(content) - 1}/{len(content)}')
+        self.assertEqual(response.content, content[100:])
+        self.assertEqual(requests.get(url, headers={'Range': f'bytes={len(content)}-'}).status_code, 416)
+
+    def test_dropped_download_is_resumed(self):
+        report = self.client.create_report(REPORT, profile_id='1000')
+        report_file = self.client.run_report(profile_id='1000', report_id=report['id'])
+        time.sleep(0.3)
+        content = b''.join(self.client.iter_report_file(report['id'], report_file['id']))
+        self.server.state.settings.disconnect_after_bytes = len(content) // 3 + 1
+
+        self.assertEqual(b''.join(self.client.iter_report_file(report['id'], report_file['id'])), content)
+        self.assertEqual(self.client.api_stats['retried'], 2)
+
+    def test_api_calls_time_out(self):
+        # a stalled call must fail and be retried instead of blocking the thread forever
+        self.assertEqual(self.client._get_http().http.timeout, 60)
+
+    def test_metadata_pages(self):
+        pages = list(self.client.list_metadata_pages(profile_id='1001', endpoint_name='campaigns'))
+        self.assertEqual([len(page) for page in pages], [10, 10, 10])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import time
+import unittest
+
+from metadata_export import MetadataExporter
+
+
+class FakeClient:
+
+    def __init__(self, pages: dict):
+        self.pages = pages
+        self.listed = []
+
+    def list_metadata_pages(self, profile_id, endpoint_name, prefetch_executor=None):
+        self.listed.append((endpoint_name, profile_id))
+        if isinstance(self.pages.get((endpoint_name, profile_id)), Exception):
+            raise self.pages[(endpoint_name, profile_id)]
+        for page in self.pages.get((endpoint_name, profile_id), []):
+            yield [dict(item) for item in page]
+
+
+class ListWriter:
+
+    def __init__(self):
+        self.rows = []
+        self.closed = False
+
+    def writerow(self, row):
+        self.rows.append(row)
+
+    def close(self):
+        self.closed = True
+
+
+class TestMetadataExporter(unittest.TestCase):
+
+    def test_export(self):
+        client = FakeClient({
+            ('campaigns', '1'): [[{'id': 'c1'}, {'id': 'c2'}], [{'id': 'c3'}]],
+            ('campaigns', '2'): [[{'id': 'c4'}]],
+            ('ads', '2'): [[]],
+        })
+        writers = {}
+
+        def _factory(endpoint):
+            writers[endpoint] = ListWriter()
+            return writers[endpoint]
+
+        rows = MetadataExporter(client, max_workers=3).export(['campaigns', 'ads', 'sites'], ['1', '2'], _factory)
+
+        self.assertEqual(rows, {'campaigns': 4, 'ads': 0, 'sites': 0})
+        self.assertEqual(sorted((row['profile_id'], row['id']) for row in writers['campaigns'].rows),
+                         [('1', 'c1'), ('1', 'c2'), ('1', 'c3'), ('2', 'c4')])
+        self.assertTrue(writers['campaigns'].closed)
+        self.assertNotIn('ads', writers)
+        self.assertNotIn('sites', writers)
+
+    def test_failed_export_cancels_queued_exports(self):
+        client = FakeClient({('campaigns', '1'): RuntimeError('listing failed')})
+        list_metadata_pages = client.list_metadata_pages
+
+        def _list_metadata_pages(profile_id, endpoint_name, prefetch_executor=None):
+            if profile_id == '2':
+                # the single worker may pick this export up before the failure is handled, keep it busy meanwhile
+                time.sleep(0.5)
+            return list_metadata_pages(profile_id, endpoint_name, prefetch_executor)
+
+        client.list_metadata_pages = _list_metadata_pages
+        with self.assertRaisesRegex(RuntimeError, 'listing failed'):
+            MetadataExporter(client, max_workers=1).export(['campaigns'], ['1', '2', '3'], lambda _: ListWriter())
+        self.assertNotIn(('campaigns', '3'), client.listed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+
+from google_cm360.discovery_cache import load_discovery_document
+from metadata_writer import MetadataTableWriter, endpoint_schema
+
+
+class TestMetadataTableWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'metadata.csv')
+
+    def _read(self) -> list:
+        with open(self.path, newline='') as file:
+            return list(csv.DictReader(file))
+
+    def test_schema_from_discovery_document(self):
+        columns, objects = endpoint_schema(load_discovery_document(), 'campaigns')
+        self.assertEqual(columns[:3], ['profile_id', 'id', 'accountId'])
+        self.assertIn('advertiserIdDimensionValue_value', columns)
+        self.assertIn('advertiserIdDimensionValue', objects)
+        self.assertIsNone(endpoint_schema(load_discovery_document(), 'unknown'))
+
+    def test_nested_fields_are_flattened(self):
+        schema = (['profile_id', 'id', 'name', 'createInfo_time', 'eventTagOverrides'], {'createInfo'})
+        writer = MetadataTableWriter(self.path, schema=schema)
+        writer.writerow({'profile_id': '1', 'id': '10', 'name': 'Campaign', 'createInfo': {'time': '123'},
+                         'eventTagOverrides': [{'id': '5'}], 'newField': {'a': 1}})
+        writer.close()
+
+        rows = self._read()
+        self.assertEqual(rows[0]['createInfo_time'], '123')
+        self.assertEqual(json.loads(rows[0]['eventTagOverrides']), [{'id': '5'}])
+        self.assertEqual(json.loads(rows[0]['additional_fields']), {'newField': {'a': 1}})
+
+    def test_columns_discovered_from_first_item(self):
+        writer = MetadataTableWriter(self.path)
+        writer.writerow({'id': '1', 'profile_id': '2', 'kind': {'name': 'browser'}})
+        writer.writerow({'id': '3', 'profile_id': '2', 'kind': {'name': 'os'}, 'extra': 'x'})
+        writer.close()
+
+        self.assertEqual(writer.columns, ['profile_id', 'id', 'kind_name', 'additional_fields'])
+        self.assertEqual([row['kind_name'] for row in self._read()], ['browser', 'os'])
+
+
+if __name__ == "__main__":
+    unittest.main()
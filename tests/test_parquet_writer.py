@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from parquet_writer import ParquetSliceWriter, metric_type
+from report_transform import transform_report_rows
+
+REPORT = (b'Report\r\n\r\nReport Fields\r\nDate,Site,Impressions,Media Cost\r\n'
+          b'2024-01-01,"Site, A",10,1\r\n2024-01-01,Site B,,2\r\n2024-01-02,"Site, A",30,2.5\r\n'
+          b'Grand Total:,,40,5.5\r\n')
+
+
+class TestParquetSliceWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'slice.parquet')
+
+    def test_report_rows_are_written_as_typed_columns(self):
+        columns = ['profileId', 'profileName', 'date', 'site', 'impressions', 'mediaCost']
+        stats = {}
+        with ParquetSliceWriter(self.path, columns, metric_columns=2, batch_rows=2) as writer:
+            header = transform_report_rows([REPORT], writer, profile_id='1', profile_name='Profile', stats=stats)
+
+        self.assertEqual(header, ['profileId', 'profileName', 'Date', 'Site', 'Impressions', 'Media Cost'])
+        self.assertEqual(stats['rows'], 3)
+        table = pq.read_table(self.path)
+        self.assertEqual(table.schema.field('site').type, pa.dictionary(pa.int32(), pa.string()))
+        self.assertEqual(table.schema.field('impressions').type, pa.int64())
+        self.assertEqual(table.schema.field('mediaCost').type, pa.float64())
+        self.assertEqual(table.column('impressions').to_pylist(), [10, None, 30])
+        self.assertEqual(table.column('mediaCost').to_pylist(), [1.0, 2.0, 2.5])
+        self.assertEqual(table.column('site').to_pylist(), ['Site, A', 'Site B', 'Site, A'])
+
+    def test_slices_share_one_schema(self):
+        columns = ['date', 'impressions', 'mediaCost']
+        with ParquetSliceWriter(self.path, columns, metric_columns=2) as writer:
+            writer.writerow(['2024-01-01', '1', '2'])
+        other_path = os.path.join(os.path.dirname(self.path), 'other.parquet')
+        with ParquetSliceWriter(other_path, columns, metric_columns=2) as writer:
+            writer.writerow(['2024-01-01', '', '2.5'])
+
+        self.assertEqual(pq.read_schema(self.path), pq.read_schema(other_path))
+        self.assertEqual(pq.read_table(self.path).column('mediaCost').to_pylist(), [2.0])
+
+    def test_metric_type_by_name(self):
+        for name in ['impressions', 'clicks', 'activeViewNotMeasurableImpressions', 'richMediaVideoPlays',
+                     'uniqueReachTotalReach', 'transactionCount']:
+            self.assertEqual(metric_type(name), pa.int64(), name)
+        for name in ['mediaCost', 'totalConversions', 'clickRate', 'activeViewPercentageViewableImpressions',
+                     'percentInvalidClicks', 'revenuePerThousandImpressions', 'uniqueReachAverageImpressionFrequency',
+                     'floodlightVariableMetric1']:
+            self.assertEqual(metric_type(name), pa.float64(), name)
+
+    def test_decimal_count_metric_fails(self):
+        with self.assertRaisesRegex(ValueError, 'clicks'):
+            with ParquetSliceWriter(self.path, ['date', 'clicks'], metric_columns=1) as writer:
+                writer.writerow(['2024-01-01', '1.5'])
+
+    def test_non_numeric_metric_fails(self):
+        with self.assertRaisesRegex(ValueError, 'impressions'):
+            with ParquetSliceWriter(self.path, ['date', 'impressions'], metric_columns=1) as writer:
+                writer.writerow(['2024-01-01', 'n/a'])
+
+
+if __name__ == "__main__":
+    unittest.main()
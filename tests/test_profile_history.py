@@ -0,0 +1,36 @@
+import unittest
+
+from profile_history import ProfileHistory
+
+
+class TestProfileHistory(unittest.TestCase):
+
+    def test_moving_average(self):
+        history = ProfileHistory()
+        history.update('1', queue_s=10, download_s=4, size_bytes=100)
+        history.update('1', queue_s=20, download_s=8, size_bytes=300)
+        self.assertEqual(history.to_dict()['1'], dict(queue_s=15, download_s=6, bytes=200, runs=2))
+        self.assertEqual(history.expected_duration('1'), 21)
+
+    def test_longest_reports_first(self):
+        history = ProfileHistory({'1': dict(queue_s=10, download_s=1, bytes=1, runs=1),
+                                  '2': dict(queue_s=100, download_s=50, bytes=1, runs=1)})
+        items = [dict(profile_id='1'), dict(profile_id='2'), dict(profile_id='3')]
+        self.assertEqual([item['profile_id'] for item in history.longest_first(items)], ['3', '2', '1'])
+
+    def test_download_workers(self):
+        history = ProfileHistory({'1': dict(queue_s=0, download_s=100, bytes=1, runs=1),
+                                  '2': dict(queue_s=0, download_s=30, bytes=1, runs=1),
+                                  '3': dict(queue_s=0, download_s=30, bytes=1, runs=1)})
+        self.assertEqual(history.download_workers(['1', '2', '3'], max_workers=8), 2)
+        self.assertEqual(history.download_workers(['1', '2', '4'], max_workers=8), 8)
+
+    def test_removed_profiles_are_dropped(self):
+        history = ProfileHistory({'1': dict(queue_s=0, download_s=1, bytes=1, runs=1),
+                                  '2': dict(queue_s=0, download_s=1, bytes=1, runs=1)})
+        history.retain(['2', '3'])
+        self.assertEqual(list(history.to_dict()), ['2'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import random
+import unittest
+
+from report_polling import ReportPollScheduler
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestReportPollScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = ReportPollScheduler(initial_delay=2, max_delay=10, jitter=0, batch_window=0,
+                                             clock=self.clock, rng=random.Random(0))
+
+    def test_files_are_due_after_initial_delay(self):
+        self.scheduler.add('f1', {'file_id': 'f1'})
+        self.assertEqual(self.scheduler.pop_due(), [])
+        self.assertEqual(self.scheduler.seconds_to_next_check(), 2)
+        self.clock.now = 2
+        self.assertEqual(self.scheduler.pop_due(), ['f1'])
+
+    def test_first_check_delay_override(self):
+        self.scheduler.add('f1', {'file_id': 'f1'}, first_check_delay=0)
+        self.assertEqual(self.scheduler.pop_due(), ['f1'])
+
+    def test_backoff_is_capped(self):
+        self.scheduler.add('f1', {'file_id': 'f1'})
+        delays = []
+        for _ in range(5):
+            self.clock.now += self.scheduler.seconds_to_next_check()
+            self.scheduler.reschedule('f1', 'QUEUED')
+            delays.append(self.scheduler.seconds_to_next_check())
+        self.assertEqual(delays, [4, 8, 10, 10, 10])
+
+    def test_files_are_scheduled_independently(self):
+        self.scheduler.add('slow', {'file_id': 'slow'})
+        self.scheduler.add('fast', {'file_id': 'fast'})
+        self.clock.now = 2
+        self.scheduler.reschedule('slow', 'QUEUED')
+        self.scheduler.reschedule('fast', 'PROCESSING')
+        self.clock.now = 5
+        self.assertEqual(self.scheduler.pop_due(), ['fast'])
+
+    def test_files_due_within_window_are_batched(self):
+        self.scheduler.batch_window = 1
+        self.scheduler.add('slow', {'file_id': 'slow'})
+        self.scheduler.add('fast', {'file_id': 'fast'})
+        self.clock.now = 2
+        self.scheduler.reschedule('slow', 'QUEUED')
+        self.scheduler.reschedule('fast', 'PROCESSING')
+        self.clock.now = 5
+        self.assertEqual(sorted(self.scheduler.pop_due()), ['fast', 'slow'])
+
+    def test_finish_returns_latency(self):
+        self.scheduler.add('f1', {'file_id': 'f1'})
+        self.clock.now = 2
+        self.scheduler.reschedule('f1', 'PROCESSING')
+        self.clock.now = 7
+        latency = self.scheduler.finish('f1', 'REPORT_AVAILABLE')
+        self.assertEqual(latency, {'processing': 2, 'report_available': 7})
+        self.assertEqual(len(self.scheduler), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
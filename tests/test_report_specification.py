@@ -0,0 +1,33 @@
+import unittest
+
+from google_cm360.report_specification import CsvReportSpecification
+
+DATE_RANGE = {'relativeDateRange': 'LAST_7_DAYS', 'startDate': None, 'endDate': None}
+
+
+def _custom_report(metrics=None) -> CsvReportSpecification:
+    return CsvReportSpecification.custom_from_specification(report_name='keboola_generated_1_2_3',
+                                                            report_type='STANDARD', date_range=DATE_RANGE.copy(),
+                                                            dimensions=[{'name': 'date'}],
+                                                            metrics=metrics or ['clicks'])
+
+
+class TestReportFingerprint(unittest.TestCase):
+
+    def test_volatile_fields_are_ignored(self):
+        remote = _custom_report()
+        remote.report_representation.update(id='1', ownerProfileId='2', accountId='3', etag='"abc"',
+                                            lastModifiedTime='1700000000000')
+        self.assertEqual(remote.fingerprint(), _custom_report().fingerprint())
+
+    def test_definition_change_is_detected(self):
+        self.assertNotEqual(_custom_report(['clicks']).fingerprint(),
+                            _custom_report(['clicks', 'impressions']).fingerprint())
+        changed_range = _custom_report()
+        changed_range.modify_date_range({'relativeDateRange': None, 'startDate': '2024-01-01',
+                                         'endDate': '2024-01-31'})
+        self.assertNotEqual(changed_range.fingerprint(), _custom_report().fingerprint())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import io
+import unittest
+
+from report_transform import ReportFormatError, transform_report_stream, transform_report_stream_fast
+
+REPORT = (b'Campaign Manager 360 Report\r\n'
+          b'Date/Time Generated,"Oct 10, 2010"\r\n'
+          b'\r\n'
+          b'Report Fields\r\n'
+          b'Date,Campaign,Clicks\r\n'
+          b'2010-10-09,"Summer, ""sale""",12\r\n'
+          b'2010-10-09,"Multi\nline",3\r\n'
+          b'Grand Total:,,15\r\n')
+
+
+def _chunked(data: bytes, size: int):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+
+class TestTransformReportStream(unittest.TestCase):
+
+    def test_transform(self):
+        for chunk_size in (1, 7, 1024):
+            target = io.StringIO()
+            header = transform_report_stream(_chunked(REPORT, chunk_size), target, '123', 'Profile, Inc.')
+            self.assertEqual(header, ['profileId', 'profileName', 'Date', 'Campaign', 'Clicks'])
+            self.assertEqual(target.getvalue(),
+                             '123,"Profile, Inc.",2010-10-09,"Summer, ""sale""",12\n'
+                             '123,"Profile, Inc.",2010-10-09,"Multi\nline",3\n')
+
+    def test_missing_report_fields_fails(self):
+        with self.assertRaises(ReportFormatError):
+            transform_report_stream(_chunked(b'Some,error\r\n', 4), io.StringIO(), '123', 'profile')
+
+
+class TestTransformReportStreamFast(unittest.TestCase):
+
+    def test_matches_csv_transform(self):
+        expected = io.StringIO()
+        expected_stats = {}
+        expected_header = transform_report_stream(_chunked(REPORT, 1024), expected, '123', 'Profile, Inc.',
+                                                  stats=expected_stats)
+        self.assertEqual(expected_stats, {'rows': 2})
+        for block_size in (8, 16, 1024):
+            target = io.BytesIO()
+            stats = {}
+            header = transform_report_stream_fast(_chunked(REPORT, 5), target, '123', 'Profile, Inc.',
+                                                  block_size=block_size, stats=stats)
+            self.assertEqual(header, expected_header)
+            self.assertEqual(target.getvalue().decode('utf-8'), expected.getvalue())
+            self.assertEqual(stats, expected_stats)
+
+    def test_footer_in_quoted_value_is_data(self):
+        report = (b'Report Fields\r\nCampaign,Clicks\r\n"Spring\nGrand Total: fake",1\r\n'
+                  b'Summer,2\r\nGrand Total:,3\r\n')
+        target = io.BytesIO()
+        transform_report_stream_fast(_chunked(report, 1024), target, '1', 'p')
+        self.assertEqual(target.getvalue(), b'1,p,"Spring\nGrand Total: fake",1\n1,p,Summer,2\n')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+import math
+import unittest
+
+from run_deadline import RunDeadline
+
+
+class TestRunDeadline(unittest.TestCase):
+
+    def test_wait_ends_before_the_reserve(self):
+        now = [0.0]
+        deadline = RunDeadline(600, clock=lambda: now[0])
+        self.assertEqual(deadline.wait_time_left(), 540)
+        now[0] = 539
+        self.assertFalse(deadline.exceeded)
+        now[0] = 540
+        self.assertTrue(deadline.exceeded)
+
+    def test_reserve_is_capped(self):
+        deadline = RunDeadline(3600, clock=lambda: 0.0)
+        self.assertEqual(deadline.wait_time_left(), 3480)
+
+    def test_disabled(self):
+        deadline = RunDeadline(0)
+        self.assertFalse(deadline.enabled)
+        self.assertEqual(deadline.wait_time_left(), math.inf)
+        self.assertFalse(deadline.exceeded)
+
+
+if __name__ == "__main__":
+    unittest.main()
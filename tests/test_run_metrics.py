@@ -0,0 +1,51 @@
+import json
+import os
+import tempfile
+import unittest
+
+from run_metrics import RunMetrics
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRunMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.metrics = RunMetrics(clock=self.clock)
+
+    def test_phases_and_profiles(self):
+        with self.metrics.phase('prepare'):
+            self.clock.now += 2
+        with self.metrics.phase('run', profile_id='1'):
+            self.clock.now += 1
+        self.metrics.add_duration('download', 4, profile_id='1')
+        self.metrics.count('1', rows=1000, bytes=4096)
+        self.metrics.count('1', rows=1000, bytes=4096)
+
+        metrics = self.metrics.to_dict()
+        self.assertEqual(metrics['total_s'], 3)
+        self.assertEqual(metrics['phases'], {'prepare': 2})
+        self.assertEqual(metrics['profiles']['1'], {'run_s': 1, 'download_s': 4, 'rows': 2000, 'bytes': 8192,
+                                                    'rows_per_s': 500, 'bytes_per_s': 2048})
+
+    def test_write_and_summary(self):
+        self.metrics.add_duration('queue_wait', 10, profile_id='slow')
+        self.metrics.add_duration('queue_wait', 1, profile_id='fast')
+        self.assertIn('slowest profile slow', self.metrics.summary())
+
+        path = os.path.join(tempfile.mkdtemp(), 'run_metrics.json')
+        self.metrics.write(path, api_calls={'calls': 3})
+        with open(path) as file:
+            self.assertEqual(json.load(file)['api_calls'], {'calls': 3})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import functools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import mock
+
+import component
+from component import Component
+from google_cm360 import AsyncGoogleCM360Client, GoogleCM360Client
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'scripts'))
+
+from fake_cm360_server import FakeCM360Server, FakeServerSettings  # noqa: E402
+
+
+class TestRunWithFakeServer(unittest.TestCase):
+    """Runs the whole extraction (prepare, run, poll, download, manifest) against the local stand-in server."""
+
+    def setUp(self):
+        self.server = FakeCM360Server(FakeServerSettings(profiles=2, rows=300, queue_s=0.1, processing_s=0.1,
+                                                         disconnect_rate=0.3)).start()
+        self.addCleanup(self.server.stop)
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir, ignore_errors=True)
+        os.makedirs(os.path.join(self.data_dir, 'in'))
+        os.makedirs(os.path.join(self.data_dir, 'out', 'tables'))
+        environment = dict(KBC_DATADIR=self.data_dir, KBC_PROJECTID='test', KBC_CONFIGID='test', KBC_CONFIGROWID='test')
+        for patcher in [mock.patch.dict(os.environ, environment),
+                        mock.patch.object(component, 'GoogleCM360Client', functools.partial(
+                            GoogleCM360Client, root_url=self.server.root_url, token_uri=self.server.token_uri)),
+                        mock.patch.object(component, 'AsyncGoogleCM360Client', functools.partial(
+                            AsyncGoogleCM360Client, root_url=self.server.root_url, token_uri=self.server.token_uri))]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _run(self, async_io: bool = False):
+        config = {
+            'parameters': {
+                'profiles': list(self.server.state.profiles),
+                'input_variant': 'report_specification',
+                'report_specification': {'report_type': 'STANDARD', 'dimensions': ['date', 'campaign'],
+                                         'metrics': ['impressions', 'mediaCost']},
+                'time_range': {'period': 'LAST_7_DAYS'},
+                'destination': {'table_name': 'report', 'incremental_loading': True, 'primary_key': [],
+                                'primary_key_existing': []},
+                'performance': {'poll_initial_delay_s': 0.05, 'poll_max_delay_s': 0.1, 'requests_per_second': 0,
+                                'profile_requests_per_second': 0, 'async_io': async_io}
+            },
+            'authorization': {'oauth_api': {'credentials': {
+                'appKey': 'client', '#appSecret': 'secret',
+                '#data': json.dumps({'access_token': 'token', 'refresh_token': 'refresh', 'scope': 'dfareporting'})
+            }}}
+        }
+        with open(os.path.join(self.data_dir, 'config.json'), 'w') as file:
+            json.dump(config, file)
+        Component().run()
+
+    def _output_rows(self) -> list:
+        table_dir = os.path.join(self.data_dir, 'out', 'tables', 'report.csv')
+        rows = []
+        for name in sorted(os.listdir(table_dir)):
+            with open(os.path.join(table_dir, name)) as file:
+                rows.extend(file.read().splitlines())
+        return rows
+
+    def _state(self) -> dict:
+        with open(os.path.join(self.data_dir, 'out', 'state.json')) as file:
+            return json.load(file)
+
+    def _assert_output(self):
+        rows = self._output_rows()
+        self.assertEqual(len(rows), 2 * 300)
+        self.assertEqual({row.split(',')[0] for row in rows}, {'1000', '1001'})
+        with open(os.path.join(self.data_dir, 'out', 'tables', 'report.csv.manifest')) as file:
+            self.assertEqual(json.load(file)['columns'][:3], ['profileId', 'profileName', 'date'])
+        self.assertTrue(os.path.exists(os.path.join(self.data_dir, 'out', 'files', 'run_metrics.json')))
+        self.assertEqual(set(self._state()['reports']), {'1000', '1001'})
+
+    def test_run(self):
+        self._run()
+        self._assert_output()
+
+    def test_async_io_run(self):
+        self._run(async_io=True)
+        self._assert_output()
+
+    def test_second_run_reuses_reports_from_state(self):
+        self._run()
+        reports = self._state()['reports']
+        shutil.move(os.path.join(self.data_dir, 'out', 'state.json'), os.path.join(self.data_dir, 'in', 'state.json'))
+        shutil.rmtree(os.path.join(self.data_dir, 'out'))
+        os.makedirs(os.path.join(self.data_dir, 'out', 'tables'))
+
+        self._run()
+        self._assert_output()
+        self.assertEqual(self._state()['reports'], reports)
+        self.assertEqual(len(self.server.state.reports), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+import mock
+
+from slice_writer import open_slice
+
+
+class TestSliceWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'slice.csv.gz')
+
+    def test_compressed_slice(self):
+        lines = [f'1,profile,{i}\n'.encode() for i in range(100000)]
+        with open_slice(self.path, compress=True) as tgt:
+            for line in lines:
+                tgt.write(line)
+        with gzip.open(self.path, 'rb') as src:
+            self.assertEqual(src.read(), b''.join(lines))
+
+    def test_plain_slice(self):
+        with open_slice(self.path, compress=False) as tgt:
+            tgt.write(b'a,b\n')
+        with open(self.path, 'rb') as src:
+            self.assertEqual(src.read(), b'a,b\n')
+
+    def test_compression_error_is_raised(self):
+        with mock.patch('gzip.GzipFile.write', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                with open_slice(self.path, compress=True) as tgt:
+                    tgt.write(b'a,b\n')
+
+
+if __name__ == "__main__":
+    unittest.main()